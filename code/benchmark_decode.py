@@ -0,0 +1,71 @@
+"""
+Description: Benchmark of the reduced-resolution JPEG decoding (ImageCollection scale option).
+             For each scale, the images are decoded at 1/scale of their size and their
+             features are extracted. The decoding and extraction times are compared to the
+             full resolution, and every feature column is compared to its full resolution
+             value with:
+                 rel_error: median of |value - full| / (|full| + eps) over the images
+                 corr: Pearson correlation with the full resolution value over the images
+                 rank_corr: Spearman correlation, what matters for a screening pass
+             Run from the code folder: python benchmark_decode.py
+"""
+import time
+
+import numpy as np
+
+import helpers.features as ft
+from helpers.ImageCollection import ImageCollection
+
+scales = [1, 2, 4, 8]
+extractors = ['edges', 'texture', 'color_rgb', 'color_lab', 'color_hsv']
+n_images = 200 #Number of images used for the benchmark, None to use all of them.
+eps = 1e-12
+
+
+def decode(collection, indexes):
+    start = time.perf_counter()
+    images = np.array([collection.read_image(collection._path[i]) for i in indexes])
+    return images, time.perf_counter() - start
+
+
+def ranks(values):
+    return np.argsort(np.argsort(values, axis=0), axis=0).astype(float)
+
+
+def correlation(a, b):
+    a, b = a - a.mean(axis=0), b - b.mean(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (a * b).sum(axis=0) / np.sqrt((a ** 2).sum(axis=0) * (b ** 2).sum(axis=0))
+
+
+def benchmark_decode():
+    collections = {scale: ImageCollection(scale=scale) for scale in scales}
+    indexes = range(len(collections[1]._path) if n_images is None else min(n_images, len(collections[1]._path)))
+    results = {}
+    for scale, collection in collections.items():
+        images, decode_time = decode(collection, indexes)
+        start = time.perf_counter()
+        features, columns = ft.extract_features(images, extractors)
+        results[scale] = (images.shape[1:3], decode_time, time.perf_counter() - start, features)
+
+    full_time = results[1][1] + results[1][2]
+    print(f'{len(indexes)} images, extractors: {extractors}\n')
+    print(f'{"scale":>6} {"size":>10} {"decode (s)":>11} {"extract (s)":>12} {"speedup":>8}')
+    for scale, (size, decode_time, extract_time, _) in results.items():
+        print(f'{scale:>6} {f"{size[0]}x{size[1]}":>10} {decode_time:>11.3f} {extract_time:>12.3f} '
+              f'{full_time / (decode_time + extract_time):>8.1f}')
+
+    reference = results[1][3]
+    for scale in scales[1:]:
+        features = results[scale][3]
+        rel_error = np.median(np.abs(features - reference) / (np.abs(reference) + eps), axis=0)
+        corr = correlation(features, reference)
+        rank_corr = correlation(ranks(features), ranks(reference))
+        print(f'\nscale 1/{scale}')
+        print(f'{"feature":>28} {"rel_error":>10} {"corr":>7} {"rank_corr":>10}')
+        for column, error, c, rc in zip(columns, rel_error, corr, rank_corr):
+            print(f'{column:>28} {error:>10.4f} {c:>7.3f} {rc:>10.3f}')
+
+
+if __name__ == '__main__':
+    benchmark_decode()
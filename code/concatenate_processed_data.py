@@ -1,49 +1,57 @@
 """
 Author: Jean-Sebastien Giroux
 Date: 03/08/2024
-Description: Concatene two text file into a new one to allow the user to
+Description: Join feature sets into a new one to allow the user to
              combine feature extraction techniques when working with the
              machine learning algorithms.
              For exemple, work with edgedetection, colordetection and texteure
              detection all at the same time
+             The feature sets are feature stores (helpers.featurestore) written by
+             ImageCollection.get_feature_extraction / update_feature_extraction in
+             final_data/<test_name>. The rows are aligned by image file name, the labels
+             have to agree and the columns are copied one by one from the memmapped
+             sources, so any number of sets can be joined.
+             A source listed in sources that doesn't exist yet is extracted first.
+             Old text-only folders (one .txt file per class) are converted with
+             fs.convert_text_folder. They have no image names, so they can only be joined
+             with other converted folders of the same extraction, see legacy_sources.
 """
 import os
 
-test_number = 'End06'
-
-filepath1 = f'/home/jean-sebastien/Documents/s7/APP2/Problematique/s7-app2/data2/prob_000_edge_detection'
-filepath2 = f'/home/jean-sebastien/Documents/s7/APP2/Problematique/s7-app2/data2/prob_004_color_detection_Lab'
-#filepath3 = f'/home/jean-sebastien/Documents/s7/APP2/Problematique/s7-app2/data2/prob_006_texture_detection'
-# filepath4 = f'/home/jean-sebastien/Documents/s7/APP2/Problematique/s7-app2/data/prob_Final01_color_detection_Lab'
-# filepath5 = f'/home/jean-sebastien/Documents/s7/APP2/Problematique/s7-app2/data/prob_Final01_color_detection_HSV'
-
-filepaths = [filepath1, filepath2] #filepath2 filepath5
-output_file = f'/home/jean-sebastien/Documents/s7/APP2/Problematique/s7-app2/data2/prob_{test_number}_mix_variables'
-file_name = ['coast.txt', 'forest.txt', 'street.txt']
-
-
-if not os.path.exists(output_file):
-    os.makedirs(output_file)
-
-for name in file_name:
-    print(f'concatenationg file: {name}')
-    file1 = os.path.join(filepath1, name)
-    file2 = os.path.join(filepath2, name)
+import helpers.featurestore as fs
 
-    output = os.path.join(output_file, name)
-    with open(file1, 'r') as f1, \
-         open(file2, 'r') as f2, \
-         open(output, 'w') as out:
-
-
-        for line1, line2, line3 in zip(f1, f2): #f3, f4 line3, f2, f4, line2, line4, 
-            element1 = line1.strip().split()
-            element2 = line2.strip().split()
-
-            merged_line = element1 +  element2 #element2 + + element5
-
-            merged_line_str = ' '.join(merged_line) + '\n'
-
-            out.write(merged_line_str)
+test_number = 'End06'
 
-print('The contenation of the files have work as expected.')
\ No newline at end of file
+folder = 'final_data'
+#Feature stores to join, test name -> extractors used to create it if final_data/<test name> is not a feature store yet.
+sources = {
+    'prob_000_edge_detection': ['edges'],
+    'prob_004_color_detection_Lab': ['color_lab'],
+    # 'prob_006_texture_detection': ['texture'],
+}
+#Old text-only folders of final_data to convert and join instead, e.g. ['prob_000', 'prob_000_texture_detection'].
+#Leave sources empty when they are used, the converted rows can't be aligned with the images of a feature store.
+legacy_sources = []
+columns = None #For each source, the list of columns to keep, or None to keep all of them. e.g. [None, ['mean_L', 'mean_a']]
+how = 'exact' #'exact' refuses sources that don't have the same images, 'inner' keeps the images present in every source.
+output_folder = os.path.join(folder, f'prob_{test_number}_mix_variables')
+
+
+if __name__ == '__main__':
+    missing = {name: extractors for name, extractors in sources.items()
+               if not fs.is_feature_store(os.path.join(folder, name))}
+    if missing:
+        from helpers.ImageCollection import ImageCollection
+        collection = ImageCollection()
+        for test_name, extractors in missing.items():
+            print(f'{os.path.join(folder, test_name)} is not a feature store, extracting {extractors}...')
+            collection.update_feature_extraction(extractors=extractors, test_name=test_name)
+
+    paths = [os.path.join(folder, name) for name in sources]
+    for name in legacy_sources:
+        destination = os.path.join(folder, f'{name}_store')
+        fs.convert_text_folder(os.path.join(folder, name), destination)
+        paths.append(destination)
+
+    store = fs.join_feature_stores(paths, output_folder, columns=columns, how=how)
+    print(f'{len(store)} images and {len(store.columns)} columns have been written in {output_folder}: {store.columns}')
@@ -2,6 +2,8 @@
 Classe "ClassificationData" : vise à contenir la représentation à utiliser pour classifier par la suite
 Constructeur:
     par défaut, charge les 3 classes du laboratoire
+    avec problematique=True, charge les colonnes columns du stockage de caractéristiques final_data/folder_name
+        (helpers.featurestore), ou les fichiers .txt de chaque classe pour les anciens dossiers
     peut aussi utiliser un array ou une liste de listes
 Membres :
     pour simplifier l'utilisation dans différents modes d'entraînement des techniques et dans les prédictions subséquentes,
@@ -16,15 +18,20 @@ Membres :
                 et M la dimension de l'espace de représentation
             -> labels1array: étiquettes de classes. Entiers de 0 à L-1 générés automatiquement à partir de la dimension L dans dataLists
     extent: la plage utile des données
+    Avec un stockage de caractéristiques (store), le scaler et extent sont calculés par tranches (iter_chunks) et
+    dataLists, data1array et dataLists_norm ne sont lus qu'au premier accès : getStats ne charge jamais tout en mémoire
 Méthodes:
+    getClassAccumulators: accumule la moyenne et la covariance de chaque classe par tranches (an.GaussianAccumulator)
     getStats: calcule des statistiques descriptives sur chaque classe
     getBorders: visualise les nuages de points de chaque classe avec ou sans les frontières calculées
 """
 
 import numpy as np
 import os
+from functools import cached_property
 import helpers.analysis as an
 import helpers.classifiers as classifiers
+import helpers.featurestore as fs
 
 
 folder_name = 'prob_000'
@@ -32,45 +39,59 @@ folder_name = 'prob_000'
 
 class ClassificationData:
 
-    def __init__(self, existingData=None, problematique=False):
-        self.dataLists = []
+    def __init__(self, existingData=None, problematique=False, columns=None, chunk_size=4096):
+        """
+        chunk_size: rows read at once from the feature store, to fit the scaler and accumulate the statistics
+        """
+        self.columns = columns #Names of the columns, known only with a feature store
+        self.store = None #Feature store of the problematique, read by chunks in getStats
         if existingData is not None:
-            for data in existingData:
-                if np.asarray(data).any():
-                    self.dataLists.append(data)
+            self.dataLists = [data for data in existingData if np.asarray(data).any()]
         else:
             if not problematique:
                 # Import data from text files in subdir
-                self.dataLists.append(np.loadtxt('data'+os.sep+'data_3classes'+os.sep+'C1.txt'))
-                self.dataLists.append(np.loadtxt('data'+os.sep+'data_3classes'+os.sep+'C2.txt'))
-                self.dataLists.append(np.loadtxt('data'+os.sep+'data_3classes'+os.sep+'C3.txt'))
+                self.dataLists = [np.loadtxt('data'+os.sep+'data_3classes'+os.sep+f'C{i}.txt') for i in (1, 2, 3)]
+            elif fs.is_feature_store('final_data'+os.sep+f'{folder_name}'):
+                #Data of the problematique, only the requested columns are read and only by chunks. 
+                self.store = fs.FeatureStore('final_data'+os.sep+f'{folder_name}')
+                self.columns = self.store.default_columns if columns is None else list(columns)
             else:
-                #Load data for the problematique. 
-                self.dataLists.append(np.loadtxt('final_data'+os.sep+f'{folder_name}'+os.sep+'coast.txt'))
-                self.dataLists.append(np.loadtxt('final_data'+os.sep+f'{folder_name}'+os.sep+'forest.txt'))
-                self.dataLists.append(np.loadtxt('final_data'+os.sep+f'{folder_name}'+os.sep+'street.txt'))
-
-        self.classification = len(self.dataLists) #Number of classes to analyse
-        # reorganisation en 1 seul vecteur pour certains entraînements et les predicts
-        self.data1array = np.vstack(self.dataLists)
-        _, self._x = self.data1array.shape
+                #Old folders of the problematique, one text file per class without column names. 
+                if columns is not None:
+                    print(f'final_data{os.sep}{folder_name} has no feature store, every column of the .txt files is used.')
+                self.dataLists = [np.loadtxt('final_data'+os.sep+f'{folder_name}'+os.sep+f'{name}.txt')
+                                  for name in ('coast', 'forest', 'street')]
+
+        if self.store is not None:
+            #Only the labels are read, the min max are accumulated by chunks into the scaler. 
+            _, class_sizes = np.unique(self.store.labels, return_counts=True)
+            self.classification = len(class_sizes) #Number of classes to analyse
+            self._x = len(self.columns)
+            self.ndata = len(self.store)
+            self.scaler = an.ColumnScaler()
+            for _, data in self.store.iter_chunks(self.columns, chunk_size):
+                self.scaler.partial_fit(data)
+            # Min et max des données
+            self.extent = an.Extent(mins=self.scaler.data_min, maxs=self.scaler.data_max)
+        else:
+            class_sizes = [len(data) for data in self.dataLists]
+            self.classification = len(self.dataLists) #Number of classes to analyse
+            # reorganisation en 1 seul vecteur pour certains entraînements et les predicts
+            self.data1array = np.vstack(self.dataLists)
+            _, self._x = self.data1array.shape
+            self.ndata = len(self.data1array)
+            # Min et max des données
+            self.extent = an.Extent(ptList=self.data1array)
         self.variable_number = self._x #Number of variable per images
-        self.ndata = len(self.data1array)
 
-        # assignation des classes d'origine 0 à 2 pour C1 à C3 respectivement
-        self.labels1array = np.zeros([self.ndata, 1])
-        self.labelsLists = []
-        self.labelsLists.append(self.labels1array[range(len(self.dataLists[0]))])
-        for i in range(1,self.classification):
-            self.labels1array[range(i * len(self.dataLists[i]), (i + 1) * len(self.dataLists[i]))] = i
-            self.labelsLists.append(self.labels1array[range(i * len(self.dataLists[i]), (i + 1) * len(self.dataLists[i]))])
+        # assignation des classes d'origine 0 à 2 pour C1 à C3 respectivement, dans l'ordre de data1array
+        self.labels1array = np.repeat(np.arange(self.classification), class_sizes).reshape(-1, 1).astype(float)
+        ends = np.cumsum(class_sizes)
+        self.labelsLists = [self.labels1array[end - size:end] for end, size in zip(ends, class_sizes)]
 
         for i in range(self.classification ):
             print(len(self.labelsLists[i]))
 
-        # Min et max des données
-        self.extent = an.Extent(ptList=self.data1array)
-
         self.m = []
         self.cov = []
         self.valpr = []
@@ -79,29 +100,70 @@ class ClassificationData:
 
         if existingData is None:
              
-            #Normalise data between 0 and 1. 
-            self.data1array, _ =an.scaleDataPerColumn(self.data1array) #  scaleDataPerColumn  scaleData
-            self.dataLists_norm = []
-            for i in range(self.classification):
-                temp, _ = an.scaleDataPerColumn(self.dataLists[i])
-                self.dataLists_norm.append(temp)
+            #Normalise data between -1 and 1, every class with the min max of the whole dataset. 
+            #The fitted scaler is kept to scale new data the same way (self.scaler.transform, self.scaler.save). 
+            #With a feature store the scaler is already fitted and the normalised data are read at the first access. 
+            if self.store is None:
+                self.scaler = an.ColumnScaler().fit(self.data1array)
+                self.data1array = self.scaler.transform(self.data1array)
+                self.dataLists_norm = [self.scaler.transform(data) for data in self.dataLists]
 
-            self.getStats(gen_print=True, save_cov_txt=True)
+            self.getStats(gen_print=True, save_cov_txt=True, chunk_size=chunk_size)
 
         else:
             self.getStats(gen_print=True)
             self.getBorders()
 
-    def getStats(self, gen_print=False, save_cov_txt=False):
+    @cached_property
+    def dataLists(self):
+        """
+        Rows of each class, read from the feature store at the first access.
+        """
+        return self.store.class_lists(self.columns)
+
+    @cached_property
+    def data1array(self):
+        """
+        All the normalised rows in one array, read from the feature store at the first access.
+        """
+        return self.scaler.transform(np.vstack(self.dataLists), copy=False)
+
+    @cached_property
+    def dataLists_norm(self):
+        """
+        Normalised rows of each class, read from the feature store at the first access.
+        """
+        return [self.scaler.transform(data) for data in self.dataLists]
+
+    def getClassAccumulators(self, chunk_size=4096):
+        """
+        Accumulates the normalised statistics of each class by chunks of chunk_size rows.
+        With a feature store the chunks are read from its memmap, the whole dataset is never needed in memory.
+        """
+        accumulators = [an.GaussianAccumulator() for _ in range(self.classification)]
+        if self.store is not None:
+            classes = np.unique(self.store.labels)
+            for labels, data in self.store.iter_chunks(self.columns, chunk_size):
+                data = self.scaler.transform(data, copy=False)
+                for i, label in enumerate(classes):
+                    accumulators[i].update(data[labels == label])
+        else:
+            for accumulator, data in zip(accumulators, self.dataLists_norm):
+                accumulator.update(data, chunk_size=chunk_size)
+        return accumulators
+
+    def getStats(self, gen_print=False, save_cov_txt=False, chunk_size=4096):
         if not self.m:
-            for i in range(self.classification):
-                _m, _cov, _valpr, _vectpr = an.calcModeleGaussien(self.dataLists_norm[i])
+            accumulators = self.getClassAccumulators(chunk_size)
+            for accumulator in accumulators:
+                _m, _cov, _valpr, _vectpr = an.calcModeleGaussien(accumulator)
                 self.m.append(_m)
                 self.cov.append(_cov)
                 self.valpr.append(_valpr)
                 self.vectpr.append(_vectpr)
-            #Calculate for all the values in the dataset. 
-            self.m_3classes, self.cov_3classes, self.valpr_3classes, self.vectpr_3classes = an.calcModeleGaussien(self.data1array)
+            #Calculate for all the values in the dataset, the merge of the classes gives the same result as one pass. 
+            self.m_3classes, self.cov_3classes, self.valpr_3classes, self.vectpr_3classes = \
+                an.calcModeleGaussien(an.GaussianAccumulator.merged(accumulators))
         if gen_print:
             #Save the average and covariance matrix information into a .txt file to facilitate it analyse. 
             for i in range(self.classification):
@@ -4,39 +4,60 @@ Membres :
     image_folder: le sous-répertoire d'où les images sont chargées
     image_list: une énumération de tous les fichiers .jpg dans le répertoire ci-dessus
     images: une matrice de toutes les images, (optionnelle, changer le flag load_all du constructeur à True)
+        avec shared_memory=True, la matrice est placée en mémoire partagée pour les processus d'extraction
+        avec use_cache=True, la matrice est lue en memmap depuis la cache d'images décodées (cache_folder)
+    feature_cache: cache des caractéristiques par image (helpers.featurecache), avec feature_cache_size en octets
     all_images_loaded: un flag qui indique si la matrice ci-dessus contient les images ou non
+    scale: les images sont décodées à 1/scale de leur taille (1, 2, 4 ou 8), pour des passes rapides approximatives
 Méthodes pour la problématique :
     generateRGBHistograms : calcul l'histogramme RGB de chaque image, à compléter
     generateRepresentation : vide, à compléter pour la problématique
 Méthodes génériques :
+    read_image: décode un fichier d'image, réduit à 1/scale directement par le décodeur JPEG
+    load_image: charge une image, depuis la matrice si elle est chargée
+    iter_batches: itère sur la collection par lots d'images décodées en arrière-plan, mémoire bornée
     generateHistogram : histogramme une image à 3 canaux de couleurs arbitraires
     images_display: affiche quelques images identifiées en argument
     view_histogrammes: affiche les histogrammes de couleur de qq images identifiées en argument
 """
 
 import csv
+import hashlib
+import json
 import matplotlib.pyplot as plt
 import numpy as np
 import os
 import glob
 import random
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from enum import IntEnum, auto
+from multiprocessing import shared_memory
 from PIL import Image
 
-from skimage import color as skic
 from skimage import io as skiio
-from scipy.ndimage import label
-from skimage.feature import graycomatrix, graycoprops
 from sklearn.decomposition import PCA
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import silhouette_score
 from scipy.signal import convolve2d
-from skimage import filters
 
 import helpers.analysis as an
+import helpers.checkpoint as ckpt
+import helpers.featurecache as fc
+import helpers.features as ft
+import helpers.featurestore as fs
+import helpers.imageprocessing as ip
+from helpers.instrumentation import PROFILER, ProgressReporter
 from helpers.ClassificationData import ClassificationData
 
 
+#Extractors used by default by get_feature_extraction, see helpers.features.EXTRACTORS
+DEFAULT_EXTRACTORS = ('edges', 'texture')
+#Reduction factors supported by the JPEG decoder, see ImageCollection.read_image
+DECODE_SCALES = (1, 2, 4, 8)
+
+
 class ImageCollection:
     """
     Classe globale pour regrouper les infos utiles et les méthodes de la collection d'images
@@ -46,9 +67,17 @@ class ImageCollection:
         forest = auto()
         street = auto()
 
-    def __init__(self, load_all=False):
+    def __init__(self, load_all=False, shared_memory=False, use_cache=False, feature_cache_size=None, scale=1,
+                 progress=False):
         # liste de toutes les images
         self.image_folder = r"data" + os.sep + "baseDeDonneesImages"
+        # Facteur de réduction au décodage (1, 2, 4 ou 8), voir read_image
+        if scale not in DECODE_SCALES:
+            raise ValueError(f'scale must be one of {DECODE_SCALES}, not {scale}')
+        self.scale = scale
+        # Affiche la progression et le temps par étape de l'extraction (helpers.instrumentation)
+        self.progress = progress
+        self.cache_folder = r"data" + os.sep + "cache"
         self._path = glob.glob(self.image_folder + os.sep + r"*.jpg")
         image_list = os.listdir(self.image_folder)
         # Filtrer pour juste garder les images
@@ -56,12 +85,35 @@ class ImageCollection:
 
         self.all_images_loaded = False
         self.images = []
+        self._shared_images = None
+        self.shared_images_info = None
+        # Cache des caractéristiques par image, désactivée si feature_cache_size est None
+        self.feature_cache = None
+        # Images converties en Lab / HSV par get_color_planes, les color_cache_size plus récentes
+        self._color_cache = OrderedDict()
+        self.color_cache_size = 64
+        if feature_cache_size is not None:
+            self.feature_cache = fc.FeatureCache(self.cache_folder + os.sep + "features", feature_cache_size)
 
         # Crée un array qui contient toutes les images
         # Dimensions [980, 256 ,256, 3]
         #            [Nombre image, hauteur, largeur, channels]
-        if load_all:
-            self.images = np.array([np.array(skiio.imread(image)) for image in self._path])
+        if load_all and use_cache:
+            # Les images décodées sont lues à la demande depuis la cache, seulement les pages utilisées sont lues
+            self.images = self.load_cached_images()
+            self.all_images_loaded = True
+            if shared_memory:
+                self.publish_shared_images()
+        elif load_all and shared_memory:
+            # Décode directement dans le bloc partagé pour éviter une 2e copie de la matrice
+            first_image = self.read_image(self._path[0])
+            self.images = self.allocate_shared_images((len(self._path),) + first_image.shape, first_image.dtype)
+            self.images[0] = first_image
+            for i, image in enumerate(self._path[1:], 1):
+                self.images[i] = self.read_image(image)
+            self.all_images_loaded = True
+        elif load_all:
+            self.images = np.array([self.read_image(image) for image in self._path])
             self.all_images_loaded = True
 
         self.labels = []
@@ -77,6 +129,163 @@ class ImageCollection:
             
         self.labels = np.array(self.labels)
 
+    def __getstate__(self):
+        """
+        Drop the image stack when the collection is sent to a worker process. 
+        """
+        state = self.__dict__.copy()
+        state['images'] = []
+        state['all_images_loaded'] = False
+        state['_shared_images'] = None
+        state['feature_cache'] = None
+        state['_color_cache'] = OrderedDict()
+        return state
+
+    def read_image(self, path):
+        """
+        Decode one image file, reduced by self.scale. 
+        With scale > 1, JPEG files are decoded directly at 1/scale of their size by the DCT scaling of the decoder 
+        (PIL draft mode), which is much faster than decoding at full size. Other files are decoded then reduced. 
+        """
+        with PROFILER.stage('decode', 1):
+            if self.scale == 1:
+                return np.array(skiio.imread(path))
+            with Image.open(path) as image:
+                size = (image.width // self.scale, image.height // self.scale)
+                image.draft('RGB', size)
+                image = image.convert('RGB')
+                if image.size != size:
+                    image = image.resize(size, Image.BOX)
+                return np.asarray(image)
+
+    def get_image_manifest(self):
+        """
+        Describe the image files (name, size, modification time) in the order of the image stack. 
+        """
+        manifest = []
+        for path in self._path:
+            stat = os.stat(path)
+            manifest.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+        return manifest
+
+    def load_cached_images(self):
+        """
+        Open the decoded images cache in read-only memmap mode. 
+        The cache is rebuilt when the manifest of the image folder doesn't match the one saved with it. 
+        """
+        suffix = '' if self.scale == 1 else f'_1-{self.scale}'
+        cache_file = os.path.join(self.cache_folder, f'images{suffix}.npy')
+        manifest_file = os.path.join(self.cache_folder, f'manifest{suffix}.json')
+        manifest = self.get_image_manifest()
+
+        cached_manifest = None
+        if os.path.exists(cache_file) and os.path.exists(manifest_file):
+            with open(manifest_file, 'r') as file:
+                cached_manifest = json.load(file)
+        if cached_manifest != manifest:
+            self.build_image_cache(cache_file, manifest_file, manifest)
+
+        return np.load(cache_file, mmap_mode='r')
+
+    def build_image_cache(self, cache_file, manifest_file, manifest):
+        """
+        Decode every image once in a .npy file, the manifest is written last so an interrupted build is never used. 
+        """
+        print('Building the decoded images cache...')
+        if not os.path.exists(self.cache_folder):
+            os.makedirs(self.cache_folder)
+        if os.path.exists(manifest_file):
+            os.remove(manifest_file)
+
+        first_image = self.read_image(self._path[0])
+        images = np.lib.format.open_memmap(cache_file + '.tmp', mode='w+', dtype=first_image.dtype,
+                                           shape=(len(self._path),) + first_image.shape)
+        images[0] = first_image
+        for i, image in enumerate(self._path[1:], 1):
+            images[i] = self.read_image(image)
+        images.flush()
+        del images
+        os.replace(cache_file + '.tmp', cache_file)
+
+        with open(manifest_file + '.tmp', 'w') as file:
+            json.dump(manifest, file)
+        os.replace(manifest_file + '.tmp', manifest_file)
+
+    def allocate_shared_images(self, shape, dtype):
+        """
+        Create a shared memory block for the image stack and return an array that uses it. 
+        Worker processes only need shared_images_info (name, shape, dtype) to read it. 
+        """
+        self.release_shared_images()
+        dtype = np.dtype(dtype)
+        self._shared_images = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * dtype.itemsize)
+        self.shared_images_info = (self._shared_images.name, tuple(shape), dtype.str)
+        return np.ndarray(shape, dtype=dtype, buffer=self._shared_images.buf)
+
+    def publish_shared_images(self):
+        """
+        Move the loaded images in shared memory, return the information needed to attach to it. 
+        """
+        if self._shared_images is None:
+            images = np.asarray(self.images)
+            shared = self.allocate_shared_images(images.shape, images.dtype)
+            shared[:] = images
+            self.images = shared
+        return self.shared_images_info
+
+    def release_shared_images(self):
+        """
+        Free the shared memory block, the images are copied back in private memory if they are still loaded. 
+        """
+        if self._shared_images is None:
+            return
+        if self.all_images_loaded:
+            self.images = np.array(self.images)
+        else:
+            self.images = []
+        self._shared_images.close()
+        self._shared_images.unlink()
+        self._shared_images = None
+        self.shared_images_info = None
+
+    def load_image(self, index):
+        """
+        Load one image of the collection, from the image stack if it is loaded. 
+        """
+        if self.all_images_loaded:
+            return self.images[index]
+        return self.read_image(self._path[index])
+
+    def iter_batches(self, batch_size=32, prefetch=2, n_threads=4, indexes=None):
+        """
+        Iterate over the collection by batches of (filenames, labels, images). 
+        The next batches are decoded by a pool of threads while the current one is processed, 
+        at most prefetch batches are in flight on top of the one returned, whatever the size of the dataset. 
+        indexes: images to iterate over, all the collection by default
+        """
+        if indexes is None:
+            indexes = np.arange(len(self._path))
+        batches = [indexes[start:start + batch_size] for start in range(0, len(indexes), batch_size)]
+
+        if self.all_images_loaded:
+            for batch in batches:
+                yield [os.path.basename(self._path[i]) for i in batch], self.labels[batch], self.images[batch]
+            return
+
+        with ThreadPoolExecutor(max_workers=n_threads) as executor:
+            pending = deque()
+            for batch in batches:
+                pending.append((batch, [executor.submit(self.read_image, self._path[i]) for i in batch]))
+                if len(pending) <= prefetch:
+                    continue
+                batch, decoding = pending.popleft()
+                yield [os.path.basename(self._path[i]) for i in batch], self.labels[batch], \
+                    np.array([image.result() for image in decoding])
+            while pending:
+                batch, decoding = pending.popleft()
+                yield [os.path.basename(self._path[i]) for i in batch], self.labels[batch], \
+                    np.array([image.result() for image in decoding])
+
     def standardization(self, data) -> float:
         """
         Standardize data between 0 and 1. 
@@ -105,464 +314,537 @@ class ImageCollection:
         """
         # Construction des histogrammes
         # 1 histogram per color channel
-        n_channels = 3
-        pixel_values = np.zeros((n_channels, n_bins))
-        for i in range(n_bins):
-            for j in range(n_channels):
-                pixel_values[j, i] = np.count_nonzero(image[:, :, j] == i)
-        return pixel_values
+        return ip.batch_histograms(image, n_bins).astype(float)
 
-    def get_generateHistograms(self, images_norm):
+    def get_generateHistograms(self, images_norm, n_bins=256, value_range=None):
         """
         Calcule les histogrammes RGB de toutes les images
+        Les images sont traitées en lot, (N, 3, n_bins)
         """
-        rgb_histograms = []
-        for sample in images_norm: 
-            rgb_histograms.append(self.generateHistogram(sample))
-
-        return np.array(rgb_histograms)
+        return ip.batch_histograms(images_norm, n_bins, value_range).astype(float)
     
     def convert_rgb2lab(self, data_set):
         """
-        Convert rgb to lab 
+        Convert rgb to lab, one image or a batch, in float32
         """
-        return skic.rgb2lab(data_set) 
+        return ip.rgb_to_lab(data_set) 
     
     def convert_rgb2hsv(self, data_set):
         """
-        Convert rgb to hsv
-        """
-        return skic.rgb2hsv(data_set)
+        Convert rgb to hsv, one image or a batch, in float32
+        """
+        return ip.rgb_to_hsv(data_set)
+
+    def get_color_planes(self, indexes, color_space):
+        """
+        Load some images of the collection converted in 'Lab' or 'HSV'. 
+        The converted images are kept in a cache of color_cache_size images, the images missing from it are 
+        converted in one batch. 
+        """
+        missing = [index for index in indexes if (index, color_space) not in self._color_cache]
+        if missing:
+            batch = np.array([self.load_image(index) for index in missing])
+            converted = self.convert_rgb2lab(batch) if color_space == 'Lab' else self.convert_rgb2hsv(batch)
+            for index, planes in zip(missing, converted):
+                self._color_cache[(index, color_space)] = planes
+        planes = []
+        for index in indexes:
+            self._color_cache.move_to_end((index, color_space))
+            planes.append(self._color_cache[(index, color_space)])
+        while len(self._color_cache) > max(self.color_cache_size, len(indexes)):
+            self._color_cache.popitem(last=False)
+        return planes
     
-    def convolve2d(self, image, kernel):
+    def convolve2d(self, image, kernel, method='auto'):
         """
-        Apply 2D convolution without padding
+        Apply 2D convolution with zero padding on one image (H, W) or a batch of images (N, H, W). 
+        Separable kernels use two 1D passes and large kernels are applied with the FFT, see ip.convolve2d. 
         """
-        kernel = np.flipud(np.fliplr(kernel))
-        output = np.zeros_like(image)
-
-        #Convolution 
-        image_padded = np.pad(image, ((kernel.shape[0]//2, kernel.shape[1]//2),
-                                    (kernel.shape[0]//2, kernel.shape[1]//2)), 
-                            mode='constant', constant_values=0).astype(np.float32)
-        #Apply the convolution on the gray image. 
-        for x in range(image.shape[1]):
-            for y in range(image.shape[0]):
-                output[y, x] = (kernel * image_padded[y: y+kernel.shape[0], x: x+kernel.shape[1]]).sum()
-        
-        return output
+        return ip.convolve2d(image, kernel, method)
     
     def edge_detection(self, images):
         """
-        Do edge detection for one image in the data set. 
+        Do edge detection for one grayscale image (H, W) or a batch (N, H, W), see ip.sobel_gradients. 
         """
         #Calculate the gradients with the sobel filter. 
-        gradient_x = filters.sobel_h(images) #convolve2d(images, sobel_x)
-        gradient_y = filters.sobel_v(images)
-
-        #Combine into one resulting image
-        image_result = np.sqrt(gradient_x**2 + gradient_y**2)
-        image_result = (image_result / image_result.max()) * 255
+        gradient_x, gradient_y = ip.sobel_gradients(np.asarray(images, dtype=float))
 
-        #Display information for debugging reasons if wanted. 
-        verbose = 0
-        if verbose: 
-            Image.fromarray(image_result.astype('uint8'), 'L').show()
-
-        return image_result, gradient_x, gradient_y
+        #Combine into one resulting image normalised between 0 and 255
+        return ip.edge_magnitude(gradient_x, gradient_y), gradient_x, gradient_y
     
     def rgb_to_grayscale(self, rgb_image):
         """
         Convert a rgb image into a grayscale image. 
         """
-        R = rgb_image[:, :, 0]
-        G = rgb_image[:, :, 1]
-        B = rgb_image[:, :, 2]
-
-        #Manually convert a GGB image into grayscale. 
-        grayscale = 0.2989 * R + 0.5870 * G + 0.1140 * B
-
-        #Visualise the image if wanted. 
-        verbose = 0
-        if verbose: 
-            Image.fromarray(rgb_image.astype('uint8')).show()
-            Image.fromarray(grayscale.astype('uint8'), 'L').show()
-
-        return grayscale
+        return ip.rgb_to_gray(rgb_image, dtype=np.float64)
     
-    def get_edge_detection(self, images):
+    def get_edge_detection(self, images, chunk_size=64):
         """
         Apply edge detection for all the images of the dataset. 
         Start by converting the images in grayscale and then apply the edge detection 
-        algorithm on every images. 
+        algorithm on every images, with the intermediates of the 'edges' extractor (ft.edge_images). 
+        The images are processed by chunks, the 'edges' extractor streams the chunks instead of keeping all the results. 
         """
         num_images = len(images)
         #Initialize numpy array to allow the program to work quicker. 
-        images_result = np.zeros((num_images, 256, 256))
-        gradients_x = np.zeros((num_images, 256, 256))
-        gradients_y = np.zeros((num_images, 256, 256))
-
-        for i, img in enumerate(images):
-            print(f'The program is analysing image number: {i}')
-            #convert the image into grayscale image. 
-            image_gray = self.rgb_to_grayscale(img)
-            #Apply the edgedetection 
-            image_result, gradient_x, gradient_y = self.edge_detection(image_gray)
+        images_result = np.empty((num_images,) + images.shape[1:3])
+        gradients_x = np.empty_like(images_result)
+        gradients_y = np.empty_like(images_result)
 
+        for start in range(0, num_images, chunk_size):
             #Keep result in memory 
-            images_result[i] = image_result
-            gradients_x[i] = gradient_x
-            gradients_y[i] = gradient_y
+            chunk = slice(start, start + chunk_size)
+            images_result[chunk], gradients_x[chunk], gradients_y[chunk] = ft.edge_images(images[chunk])
         
         return images_result, gradients_x, gradients_y
     
     def count_contours(self, image, threshold):
         """
-        count the connected region in one image
+        count the connected region in one image, see ft.count_contours
         """
-        #For visualisation purpose. 
-        verbose = 0
-        if verbose:
-            Image.fromarray(image.astype('uint8'), 'L').show()
-        #Put the values under the treshold at 0.
-        new_image = (image > threshold).astype(int)
-        #Visualise the transformation. 
-        if verbose:
-            Image.fromarray(new_image.astype('uint8'), 'L').show()
-
-        labeled_array, num_features = label(new_image)
-
-        return labeled_array, num_features
+        return ft.count_contours(image, threshold)
     
     def contour_lengths(self, labeled_array, num_features):
         """
-        Count the contour length for one image
+        Count the contour length for one image, see ft.contour_lengths
         """
-        lengths = np.zeros(num_features)
-
-        for i in range(1, num_features+1):
-            lengths[i-1] = np.sum(labeled_array == i)
-
-        #Extract sub values for the precise features
-        mean_lengths = np.mean(lengths)
-        total_length = np.sum(lengths)
-        std_length = np.std(lengths)
-
-        return mean_lengths, total_length, std_length
+        return ft.contour_lengths(labeled_array, num_features)
     
     def contour_orientations(self, Gx, Gy, labeled_array, num_features):
         """
-        Find the contour orientation in one image
-        """
-        orientations = np.zeros(num_features)
-        #Itterate over every features fond in the image. 
-        for i in range(1, num_features+1):
-            contour_pixels = labeled_array == i
-            gx = Gx[contour_pixels]
-            gy = Gy[contour_pixels]
-            angle = np.arctan2(gy, gx)
-            #Convert back to deg. 
-            orientations[i-1] = np.rad2deg(np.mean(angle))
-
-        #Extract sub values for the precise features
-        mean_orientation = np.mean(orientations)
-        std_orientation = np.std(orientations)
-        
-        return mean_orientation, std_orientation
+        Find the contour orientation in one image, see ft.contour_orientations
+        """
+        return ft.contour_orientations(Gx, Gy, labeled_array, num_features)
     
+    def color_statistics(self, images, percentiles=(25, 75)):
+        """
+        Calculate the mean, variance, median and percentiles of every channel of one image or a batch of images
+        in one pass, see imageprocessing.batch_color_statistics
+        """
+        return ip.batch_color_statistics(images, percentiles)
+
     def mean_value(self, image):
         """
         Calculate the mean value of the image by channel
         """
-        verbose = 1
-        if verbose:
-            Image.fromarray(image.astype('uint8')).show()
-        mean_red = np.mean(image[:, :, 0])
-        mean_green = np.mean(image[:, :, 1])
-        mean_blue = np.mean(image[:, :, 2])
-
-        return mean_red, mean_green, mean_blue
+        return tuple(ip.batch_color_statistics(image, ())['mean'])
 
     def median_value(self, image):
         """
         Calculate the median value of the image by channel
         """
-        meidan_red = np.median(image[:, :, 0])
-        meidan_green = np.median(image[:, :, 1])
-        meidan_blue = np.median(image[:, :, 2])
-
-        return meidan_red, meidan_green, meidan_blue
+        return tuple(ip.batch_color_statistics(image, ())['median'])
     
     def variance_value(self, image):
         """
         Calculate the variance of the images by channels
         """
-        var_red = np.var(image[:, :, 0])
-        var_green = np.var(image[:, :, 1])
-        var_blue = np.var(image[:, :, 2])
-
-        return var_red, var_green, var_blue
+        return tuple(ip.batch_color_statistics(image, ())['variance'])
     
     def pourcentile_value(self, image):
         """
         Calculate the percentile value from the image channels
+        Return the 25 and 75 percentiles of the red, green and blue channels
         """
-        percentile25_red = np.percentile(image[:, :, 0], 25)
-        percentile75_red = np.percentile(image[:, :, 0], 75)
-
-        percentile25_green = np.percentile(image[:, :, 1], 25)
-        percentile75_green = np.percentile(image[:, :, 1], 75)
-
-        percentile25_blue = np.percentile(image[:, :, 2], 25)
-        percentile75_blue = np.percentile(image[:, :, 2], 75)
-
-        return percentile25_red, percentile75_red, percentile25_green, percentile75_green, percentile25_blue, percentile75_blue
+        statistics = ip.batch_color_statistics(image, (25, 75))
+        return tuple(np.stack([statistics['percentile25'], statistics['percentile75']], axis=-1).ravel())
     
-    def texture_extraction(self, image):
+    def texture_extraction(self, image, distances=(1,), angles=(0,), levels=256, average_angles=False):
         """
-        Extract the texture of the image
+        Extract the texture of the image, works also on a batch of images (N, H, W, 3). 
+        Only the requested distances and angles are computed, with one feature per property, distance and angle, 
+        or per property and distance with the mean over the angles if average_angles (rotation invariant), 
+        see ft.texture_columns. 
+        levels: number of gray levels of the GLCM, e.g. 16, 32 or 64 for smaller matrices
         """
-        #Convert the image with values between 0 and 255
-        gray_image = skic.rgb2gray(image)
-        gray_image = (gray_image*255).astype('uint8')
-
-        #Extract the GLCM value 
-        distances = [1]
-        #Set the angles values. 
-        angles = [0, np.pi/4, np.pi/2, 3*np.pi/4]
-        glcm = graycomatrix(gray_image, distances=distances, angles=angles, levels=256, symmetric=True, normed=True)
         #List of texture features to extract
-        features = ['contrast', 'dissimilarity', 'homogeneity', 'energy', 'correlation', 'ASM']
-        texture_features = {feature: graycoprops(glcm, feature)[0, 0] for feature in features}
+        features = ft.texture_columns(distances, angles, average_angles)
+        #Extract the GLCM value on the gray image with values between 0 and 255, same code as the 'texture' extractor
+        values = ft.texture_properties(ip.texture_gray(image[np.newaxis] if image.ndim == 3 else image),
+                                       distances=distances, angles=angles, levels=levels,
+                                       average_angles=average_angles)
+        texture_features = {feature: values[:, j] for j, feature in enumerate(features)}
+        if image.ndim == 3:
+            texture_features = {feature: values[0] for feature, values in texture_features.items()}
 
         return features, texture_features
 
-    def get_feature_extraction(self, input_data, label_test):
+    def extract_features_range(self, images, start, extractors, batch_size=64):
+        """
+        Extract the features for a contiguous range of images with the extractors of helpers.features. 
+        The images are processed by batches of batch_size, the edges and textures of the whole range are never 
+        in memory at the same time. 
+        Return (start, features, failures, timings): one row per image, the (index, error) of the images that failed 
+        and the time spent in each stage (helpers.instrumentation), a failing image does not stop the others, 
+        its row is left to nan. 
+        """
+        snapshot = PROFILER.snapshot()
+        features = np.full((len(images), len(ft.get_schema(extractors))), np.nan)
+        failures = []
+        for batch_start in range(0, len(images), batch_size):
+            batch = slice(batch_start, batch_start + batch_size)
+            try:
+                ft.extract_batch(images[batch], extractors, features[batch])
+            except Exception:
+                #Retry image by image to know which one fails. 
+                for j in range(batch.start, min(batch.stop, len(images))):
+                    try:
+                        ft.extract_batch(images[j:j + 1], extractors, features[j:j + 1])
+                    except Exception as error:
+                        features[j] = np.nan
+                        failures.append((start + j, f'{type(error).__name__}: {error}'))
+        return start, features, failures, PROFILER.since(snapshot)
+
+    def extract_features_shared(self, shared_images_info, start, stop, extractors):
+        """
+        Extract the features for the images [start, stop) of a stack published in shared memory. 
+        """
+        name, shape, dtype = shared_images_info
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            images = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            results = self.extract_features_range(images[start:stop], start, extractors)
+            del images
+        finally:
+            block.close()
+        return results
+
+    def extract_features_cached(self, cache_file, start, stop, extractors):
+        """
+        Extract the features for the images [start, stop) of the decoded images cache. 
+        """
+        images = np.load(cache_file, mmap_mode='r')
+        return self.extract_features_range(images[start:stop], start, extractors)
+
+    def get_feature_matrix(self, input_data, extractors, n_workers=1, chunk_size=None, checkpoint_folder=None,
+                           checkpoint_images=None):
+        """
+        Extract the features of every image in a (n_images, n_features) matrix, in the original image order. 
+        extractors: names of helpers.features.EXTRACTORS, or (name, parameters) tuples
+        With the feature cache, the columns of an extractor are only computed for the images it does not contain. 
+        checkpoint_folder, checkpoint_images: write the results by chunks to resume an interrupted run, 
+                                              see compute_feature_matrix
+        Return the features, the name of the columns and a mask of the images that have been analysed. 
+        """
+        if self.feature_cache is None:
+            return self.compute_feature_matrix(input_data, extractors, n_workers=n_workers, chunk_size=chunk_size,
+                                               checkpoint_folder=checkpoint_folder,
+                                               checkpoint_images=checkpoint_images)
+
+        columns = ft.get_schema(extractors)
+        num_images = len(input_data)
+        hashes = fc.image_hashes(input_data)
+        features = np.empty((num_images, len(columns)))
+        valid = np.ones(num_images, dtype=bool)
+
+        #Read what the cache already has, extractor by extractor. 
+        missing = []
+        missing_rows = np.zeros(num_images, dtype=bool)
+        column = 0
+        for requested, (extractor, params) in zip(extractors, ft.resolve_extractors(extractors)):
+            columns_slice = slice(column, column + len(extractor.get_columns(params)))
+            key, description = fc.extractor_key(extractor.name, params, extractor.version)
+            values, found = self.feature_cache.load(key, hashes)
+            if found.any():
+                features[found, columns_slice] = values[found]
+            if not found.all():
+                missing.append((requested, columns_slice, key, description))
+                missing_rows |= ~found
+            column = columns_slice.stop
+
+        #Compute only the missing extractors, on the images missing in at least one of them. 
+        if missing:
+            rows = np.flatnonzero(missing_rows)
+            print(f'Feature cache: {len(rows)} image(s) to analyse for {[entry[0] for entry in missing]}.')
+            subset = input_data if len(rows) == num_images else input_data[rows]
+            computed, _, valid[rows] = self.compute_feature_matrix(subset, [entry[0] for entry in missing],
+                                                                   n_workers=n_workers, chunk_size=chunk_size,
+                                                                   image_numbers=rows,
+                                                                   checkpoint_folder=checkpoint_folder,
+                                                                   checkpoint_images=hashes[rows]
+                                                                   if checkpoint_images is None
+                                                                   else [checkpoint_images[i] for i in rows])
+            column = 0
+            for requested, columns_slice, key, description in missing:
+                values = computed[:, column:column + columns_slice.stop - columns_slice.start]
+                features[rows, columns_slice] = values
+                self.feature_cache.store(key, description, hashes[rows], values)
+                column += values.shape[1]
+        else:
+            print('Feature cache: every feature comes from the cache.')
+        self.feature_cache.save()
+
+        return features, columns, valid
+
+    def compute_feature_matrix(self, input_data, extractors, n_workers=1, chunk_size=None, image_numbers=None,
+                               checkpoint_folder=None, checkpoint_images=None, shard_size=64):
+        """
+        Extract the features of every image in a (n_images, n_features) matrix, without the feature cache. 
+        image_numbers: number of each image in the collection, used to report the failures
+        With n_workers > 1 the images are split in chunks that are processed by a pool of processes. 
+        If input_data is the image stack published in shared memory or read from the images cache, the workers 
+        only receive its name and the index range to analyse. 
+        With a checkpoint_folder, the chunks are the fixed grid of shards of shard_size images, whatever n_workers 
+        and chunk_size, and each shard is written in it as soon as it is done (helpers.checkpoint). 
+        A run restarted on the same images and extractors skips the shards already written, with any number of 
+        workers, the workers take the remaining shards one after the other. 
+        checkpoint_images: description of the images, e.g. their manifest or file names, to not restore the shards 
+                           of other images. The content of the images is hashed when it is not given. 
+        Return the features, the name of the columns and a mask of the images that have been analysed. 
+        """
+        columns = ft.get_schema(extractors)
+        num_images = len(input_data)
+        if chunk_size is None:
+            chunk_size = max(1, int(np.ceil(num_images / (4 * n_workers))))
+            if self.progress:
+                #Smaller chunks to report the progress more often. 
+                chunk_size = min(chunk_size, 64)
+        checkpoint = None
+        if checkpoint_folder is not None:
+            chunk_size = shard_size
+            checkpoint = ckpt.ExtractionCheckpoint(checkpoint_folder, {
+                'columns': columns, 'shard_size': shard_size, 'scale': self.scale,
+                'extractors': [fc.extractor_key(extractor.name, params, extractor.version)[1]
+                               for extractor, params in ft.resolve_extractors(extractors)],
+                'images': fc.image_hashes(input_data) if checkpoint_images is None else checkpoint_images})
+
+        #Skip the chunks already written by an interrupted run. 
+        results = []
+        pending = []
+        for start in range(0, num_images, chunk_size):
+            result = checkpoint.load(start) if checkpoint is not None else None
+            if result is not None:
+                results.append(result)
+            else:
+                pending.append((start, min(start + chunk_size, num_images)))
+        if results:
+            print(f'{len(results)} chunk(s) restored from {checkpoint_folder}, {len(pending)} chunk(s) to analyse.')
+        progress = ProgressReporter(sum(stop - start for start, stop in pending), enabled=self.progress)
+
+        def done(result, in_worker):
+            start, chunk_features, failures, timings = result
+            if in_worker:
+                #The time spent in the workers is added to the one of the main process. 
+                PROFILER.merge(timings)
+            if checkpoint is not None:
+                checkpoint.commit(start, chunk_features, failures)
+            results.append((start, chunk_features, failures))
+            progress.update(len(chunk_features))
+
+        if n_workers > 1 and pending:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                if self.shared_images_info is not None and input_data is self.images:
+                    futures = [executor.submit(self.extract_features_shared, self.shared_images_info, start, stop,
+                                               extractors) for start, stop in pending]
+                elif isinstance(input_data, np.memmap) and input_data is self.images:
+                    futures = [executor.submit(self.extract_features_cached, input_data.filename, start, stop,
+                                               extractors) for start, stop in pending]
+                else:
+                    futures = [executor.submit(self.extract_features_range, input_data[start:stop], start, extractors)
+                               for start, stop in pending]
+                #Commit the chunks in the order they finish. 
+                for future in as_completed(futures):
+                    done(future.result(), in_worker=True)
+        else:
+            for start, stop in pending:
+                done(self.extract_features_range(input_data[start:stop], start, extractors), in_worker=False)
+
+        #Fill the preallocated matrix chunk by chunk. 
+        features = np.empty((num_images, len(columns)))
+        valid = np.ones(num_images, dtype=bool)
+        for start, chunk_features, failures in results:
+            features[start:start + len(chunk_features)] = chunk_features
+            #Report the images that could not be analysed instead of stopping the run. 
+            for i, error in failures:
+                print(f'Feature extraction failed for image number '
+                      f'{i if image_numbers is None else image_numbers[i]}: {error}')
+                valid[i] = False
+        if not valid.all():
+            print(f'{np.count_nonzero(~valid)} image(s) on {num_images} have been skipped.')
+
+        return features, columns, valid
+
+    def get_feature_extraction(self, input_data, label_test, extractors=DEFAULT_EXTRACTORS, selected_columns=None,
+                               test_name='prob_000', n_workers=1, filenames=None, resumable=True):
         """
         get the feature extraction. 
-        """
-        #Flag used to know which feature to extract. It is done when you are searching the optimal parameters. 
-        edge_detection = True
-        color_detection = False
-        texture_detection = True
-        categories = ['coast', 'forest', 'street']
-        image_features = {}
-
-        #Create distionaries to temporary contain the data. 
-        for categorie in categories:
-            if edge_detection:
-                #Edge detection 
-                image_features[f'images_num_features_{categorie}'] = []
-                image_features[f'images_mean_lengths_{categorie}'] = []
-                image_features[f'images_total_length_{categorie}'] = []
-                image_features[f'images_total_std_length_{categorie}'] = []
-                image_features[f'images_mean_orientation_{categorie}'] = []
-                image_features[f'images_std_orientation_{categorie}'] = []
-            if color_detection: 
-                #Color in the image
-                image_features[f'images_mean_red_{categorie}'] = []
-                image_features[f'images_mean_green_{categorie}'] = []
-                image_features[f'images_mean_blue_{categorie}'] = []
-                image_features[f'images_meidan_red_{categorie}'] = []
-                image_features[f'images_meidan_green_{categorie}'] = []
-                image_features[f'images_meidan_blue_{categorie}'] = []
-                image_features[f'images_std_red_{categorie}'] = []
-                image_features[f'images_std_green_{categorie}'] = []
-                image_features[f'images_std_blue_{categorie}'] = []               
-                image_features[f'images_percentile25_red_{categorie}'] = []
-                image_features[f'images_percentile75_red_{categorie}'] = []
-                image_features[f'images_percentile25_green_{categorie}'] = []
-                image_features[f'images_percentile75_green_{categorie}'] = []
-                image_features[f'images_percentile25_blue_{categorie}'] = []
-                image_features[f'images_percentile75_blue_{categorie}'] = []
-            if texture_detection:
-                #Texture in the image
-                image_features[f'images_contrast_{categorie}'] = []
-                image_features[f'images_dissimilarity_{categorie}'] = []
-                image_features[f'images_homogeneity_{categorie}'] = []
-                image_features[f'images_energy_{categorie}'] = []
-                image_features[f'images_correlation_{categorie}'] = []
-                image_features[f'images_ASM_{categorie}'] = []
-
-        #Pretraitement for edge detection, which is finding the edges 
-        if edge_detection: 
-            images_edge_detection, Gx, Gy = self.get_edge_detection(input_data)
-            #Flag to print information on screen, can be used when debugging or to show information. 
-            verbose = 0
-            if verbose:
-                print(f'The shape of the input image is: {images_edge_detection.shape}')
-                print(f'The shape of the gradient x is: {Gx.shape} and y is: {Gx.shape}')
-
-        for i, img in enumerate(input_data):
-            if edge_detection: 
-                #Edge detection 
-                threshold = 50 #Number that can be change when converting a gray image to a edgedetection image. 
-                labeled_array, num_features = self.count_contours(images_edge_detection[i], threshold)
-                mean_lengths, total_length, std_length = self.contour_lengths(labeled_array, num_features)
-                mean_orientation, std_orientation = self.contour_orientations(Gx[i], Gy[i], labeled_array, num_features)
-            if color_detection: 
-                #Color in the image
-                change_color_lab = False #Flag used when working with a different color format. 
-                change_color_hsv= False
-
-                if change_color_lab: 
-                    img_color = self.convert_rgb2lab(img)
-                    color_name = 'Lab'
-                elif change_color_hsv:
-                    img_color = self.convert_rgb2hsv(img)
-                    color_name = 'HSV'
-                else:
-                    img_color = img
-                    color_name = 'RGB'
-
-                #Extract color features
-                mean_red, mean_green, mean_blue = self.mean_value(img_color)
-                meidan_red, meidan_green, meidan_blue = self.median_value(img_color)
-                std_red, std_green, std_blue = self.variance_value(img_color)
-                percentile25_red, percentile75_red, percentile25_green, percentile75_green, percentile25_blue, percentile75_blue = self.pourcentile_value(img_color)
-                print(f'The program is analysing image number: {i}')
-
-            if texture_detection:
-                #Texture in the image
-                _, texture_features = self.texture_extraction(img)
-                
-                #Extract texture features
-                contrast = texture_features['contrast']
-                dissimilarity = texture_features['dissimilarity']
-                homogeneity = texture_features['homogeneity']
-                energy = texture_features['energy']
-                correlation = texture_features['correlation']
-                ASM = texture_features['ASM']
-                print(f'The program is analysing image number: {i}')
-
-            if label_test[i] == 1: 
-                location = 'coast'
-            if label_test[i] == 2: 
-                location = 'forest'
-            if label_test[i] == 3: 
-                location = 'street'
-
-            #Append the feature to the dictionaries for the image analysed. 
-            if edge_detection:
-                #Edge detection 
-                image_features[f'images_num_features_{location}'].append(num_features)
-                image_features[f'images_mean_lengths_{location}'].append(mean_lengths)
-                image_features[f'images_total_length_{location}'].append(total_length)
-                image_features[f'images_total_std_length_{location}'].append(std_length)
-                image_features[f'images_mean_orientation_{location}'].append(mean_orientation)
-                image_features[f'images_std_orientation_{location}'].append(std_orientation)
-            if color_detection:
-                #Color in the image
-                image_features[f'images_mean_red_{location}'].append(mean_red)
-                image_features[f'images_mean_green_{location}'].append(mean_green)
-                image_features[f'images_mean_blue_{location}'].append(mean_blue)
-                image_features[f'images_meidan_red_{location}'].append(meidan_red)
-                image_features[f'images_meidan_green_{location}'].append(meidan_green)
-                image_features[f'images_meidan_blue_{location}'].append(meidan_blue)
-                image_features[f'images_std_red_{location}'].append(std_red)
-                image_features[f'images_std_green_{location}'].append(std_green)
-                image_features[f'images_std_blue_{location}'].append(std_blue)              
-                image_features[f'images_percentile25_red_{location}'].append(percentile25_red)
-                image_features[f'images_percentile75_red_{location}'].append(percentile75_red)
-                image_features[f'images_percentile25_green_{location}'].append(percentile25_green)
-                image_features[f'images_percentile75_green_{location}'].append(percentile75_green)
-                image_features[f'images_percentile25_blue_{location}'].append(percentile25_blue)
-                image_features[f'images_percentile75_blue_{location}'].append(percentile75_blue)
-            if texture_detection:
-                #Texture in the image
-                image_features[f'images_contrast_{location}'].append(contrast)
-                image_features[f'images_dissimilarity_{location}'].append(dissimilarity)
-                image_features[f'images_homogeneity_{location}'].append(homogeneity)
-                image_features[f'images_energy_{location}'].append(energy)
-                image_features[f'images_correlation_{location}'].append(correlation)
-                image_features[f'images_ASM_{location}'].append(ASM)
-
-        #Write the information in a .txt file, at first save everything but later save only feature that help classification. 
-        for location in categories: 
-            if edge_detection: 
-                #Edge detection 
-                first = image_features[f'images_num_features_{location}']
-                second = image_features[f'images_mean_lengths_{location}']
-                third = image_features[f'images_total_length_{location}']
-                fourth = image_features[f'images_total_std_length_{location}']
-                fifth = image_features[f'images_mean_orientation_{location}']
-                six = image_features[f'images_std_orientation_{location}']
-
-                t1 = image_features[f'images_contrast_{location}']
-                t3 = image_features[f'images_homogeneity_{location}']
-
-
-                test_name = 'prob_000'
-                destination_folder = f'final_data/{test_name}'
-                if not os.path.exists(destination_folder):
-                    os.makedirs(destination_folder)
-                file_path = os.path.join(destination_folder, f'{location}.txt')
-
-                with open(file_path, 'w') as file:
-                    for i in range(len(first)):
-                        file.write(f'{first[i]:.5f} {t1[i]} {t3[i]}\n')
-                        #file.write(f'{first[i]:.5f} {second[i]:.5f} {third[i]:.5f} {fourth[i]:.5f} {fifth[i]:.5f} {six[i]:.5f}\n')
-
-            if color_detection: 
-                #Color in the image
-                c1 = image_features[f'images_mean_red_{location}']
-                c2 = image_features[f'images_mean_green_{location}']
-                c3 = image_features[f'images_mean_blue_{location}']
-                c4 = image_features[f'images_meidan_red_{location}']
-                c5 = image_features[f'images_meidan_green_{location}']
-                c6 = image_features[f'images_meidan_blue_{location}']
-                c7 = image_features[f'images_std_red_{location}']
-                c8 = image_features[f'images_std_green_{location}']
-                c9 = image_features[f'images_std_blue_{location}']
-                c10 = image_features[f'images_percentile25_red_{location}']
-                c11 = image_features[f'images_percentile75_red_{location}']
-                c12 = image_features[f'images_percentile25_green_{location}']
-                c13 = image_features[f'images_percentile75_green_{location}']
-                c14 = image_features[f'images_percentile25_blue_{location}']
-                c15 = image_features[f'images_percentile75_blue_{location}']
-
-                test_name = f'prob_004_color_detection_{color_name}'
-                destination_folder = f'/home/jean-sebastien/Documents/s7/APP2/s7-app2/data2/{test_name}'
-                if not os.path.exists(destination_folder):
-                    os.makedirs(destination_folder)
-                file_path = os.path.join(destination_folder, f'{location}.txt')
-
-                with open(file_path, 'w') as file:
-                    for i in range(len(c4)):
-                        #file.write(f'{c4[i]:.5f} {c13[i]:.5f}\n')
-                        file.write(f'{c7[i]:.5f}\n')
-                        #file.write(f'{c1[i]:.5f} {c2[i]:.5f} {c3[i]:.5f} {c4[i]:.5f} {c5[i]:.5f} {c6[i]:.5f} {c7[i]:.5f} {c8[i]:.5f} {c9[i]:.5f} {c10[i]:.5f} {c11[i]:.5f} {c12[i]:.5f} {c13[i]:.5f} {c14[i]:.5f} {c15[i]:.5f}\n')
-
-            if texture_detection:
-                #Texture in the image
-                t1 = image_features[f'images_contrast_{location}']
-                t2 = image_features[f'images_dissimilarity_{location}']
-                t3 = image_features[f'images_homogeneity_{location}']
-                t4 = image_features[f'images_energy_{location}']
-                t5 = image_features[f'images_correlation_{location}']
-                t6 = image_features[f'images_ASM_{location}']
-
-                test_name = 'prob_000_texture_detection'
-                destination_folder = f'/final_data/{test_name}'
-                if not os.path.exists(destination_folder):
-                    os.makedirs(destination_folder)
-                file_path = os.path.join(destination_folder, f'{location}.txt')
-
-                with open(file_path, 'w') as file:
-                    for i in range(len(t3)):
-                        pass
-                        #file.write(f'{t1[i]} {t3[i]}\n')
-                        #file.write(f'{t1[i]} {t2[i]} {t3[i]} {t4[i]} {t5[i]} {t6[i]}\n')
-
-    def generateRepresentation(self, input_data=None, label_test=None, data_processing=False, analyse_data=False, deocrelate_data=False, test_set=False):
-        if data_processing:
+        extractors: names of helpers.features.EXTRACTORS to run, or (name, parameters) tuples, 
+                    e.g. ['edges', ('texture', {'levels': 32}), 'color_lab']
+        selected_columns: names of the columns loaded by default by ClassificationData, every column by default
+        test_name: the features are written in the feature store final_data/test_name (helpers.featurestore)
+        n_workers: number of processes used to analyse the images, 1 to keep everything in the main process. 
+        filenames: file name of each image, the names of the collection by default
+        resumable: write the results by chunks in cache_folder/checkpoints/test_name while the images are analysed, 
+                   an interrupted run continues where it stopped. 
+        """
+        start_time, snapshot = time.perf_counter(), PROFILER.snapshot()
+        checkpoint_folder = os.path.join(self.cache_folder, 'checkpoints', test_name) if resumable else None
+        features, columns, valid = self.get_feature_matrix(
+            input_data, extractors, n_workers=n_workers, checkpoint_folder=checkpoint_folder,
+            checkpoint_images=self.get_image_manifest() if input_data is self.images else filenames)
+        if filenames is None:
+            filenames = [os.path.basename(path) for path in self._path] if input_data is self.images \
+                else [str(i) for i in range(len(input_data))]
+
+        #Write every column of the analysed images in the feature store, with their label and file name. 
+        destination_folder = os.path.join('final_data', test_name)
+        with PROFILER.stage('write', np.count_nonzero(valid)):
+            fs.write_feature_store(destination_folder, features[valid], columns, np.asarray(label_test)[valid],
+                                   np.asarray(filenames)[valid],
+                                   label_names={int(label): label.name for label in ImageCollection.imageLabels},
+                                   default_columns=selected_columns)
+        print(f'The features have been written in {destination_folder}: {columns}')
+        if checkpoint_folder is not None:
+            ckpt.clear_checkpoint(checkpoint_folder)
+        self.write_timings(destination_folder, time.perf_counter() - start_time, snapshot)
+
+        return features, columns
+
+    def get_file_hash(self, path):
+        """
+        Hash of the content of an image file. 
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(2**20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def update_feature_extraction(self, extractors=DEFAULT_EXTRACTORS, selected_columns=None, test_name='prob_000',
+                                  n_workers=1, resumable=True, block_size=512):
+        """
+        Incremental version of get_feature_extraction, only the new or changed images are decoded and analysed. 
+        The feature store final_data/test_name is saved with a manifest (name, size, modification time, hash) of the 
+        images it describes. An image is unchanged if its size and modification time are the same, or if its hash 
+        is the same. The rows of the deleted images are dropped. When the list of images didn't change, the rows of 
+        the changed images are rewritten in place in features.npy. 
+        Everything is extracted again if the extractors or their parameters changed. 
+        resumable: write the results by chunks while the images are analysed, see get_feature_extraction
+        block_size: the images to analyse are decoded and analysed by blocks of block_size images (iter_batches), 
+                    only a few blocks are in memory at the same time whatever the number of images. 
+                    When every image is analysed and the collection is loaded (shared memory or images cache), 
+                    the loaded stack is used directly. 
+        """
+        start_time, snapshot = time.perf_counter(), PROFILER.snapshot()
+        destination_folder = os.path.join('final_data', test_name)
+        manifest_file = os.path.join(destination_folder, 'manifest.json')
+        current = self.get_image_manifest()
+        settings = [fc.extractor_key(extractor.name, params, extractor.version)[1]
+                    for extractor, params in ft.resolve_extractors(extractors)]
+
+        previous = None
+        if fs.is_feature_store(destination_folder) and os.path.exists(manifest_file):
+            with open(manifest_file, 'r') as file:
+                previous = json.load(file)
+            if previous['extractors'] != settings or previous.get('scale', 1) != self.scale:
+                print('The extractors or the decoding scale changed, every image is analysed again.')
+                previous = None
+
+        #Compare the image folder with the manifest of the feature store. 
+        hashes = {}
+        to_extract = []
+        kept_rows = {}
+        store = fs.FeatureStore(destination_folder) if previous is not None else None
+        store_rows = {name: i for i, name in enumerate(store.filenames)} if store is not None else {}
+        for i, (name, size, mtime) in enumerate(current):
+            old = previous['images'].get(name) if previous is not None else None
+            if old is not None and name in store_rows and old[:2] == [size, mtime]:
+                hashes[name] = old[2]
+            else:
+                hashes[name] = self.get_file_hash(self._path[i])
+                if old is None or name not in store_rows or old[2] != hashes[name]:
+                    to_extract.append(i)
+                    continue
+            kept_rows[i] = store_rows[name]
+        names = [name for name, _, _ in current]
+        deleted = len(set(store_rows) - set(names))
+        print(f'Incremental extraction: {len(to_extract)} image(s) to analyse, {len(kept_rows)} unchanged, '
+              f'{deleted} deleted.')
+
+        columns = ft.get_schema(extractors)
+        computed = np.empty((0, len(columns)))
+        valid = np.ones(0, dtype=bool)
+        if to_extract:
+            checkpoint_folder = os.path.join(self.cache_folder, 'checkpoints', test_name) if resumable else None
+            if self.all_images_loaded and to_extract == list(range(len(self._path))):
+                blocks = [(to_extract, self.images)]
+            else:
+                blocks = ((to_extract[start:start + block_size], images) for start, (_, _, images) in
+                          zip(range(0, len(to_extract), block_size),
+                              self.iter_batches(block_size, indexes=np.array(to_extract))))
+            computed, valid = [], []
+            for block, (indexes, images) in enumerate(blocks):
+                #Each block has its own checkpoint, a restarted run restores the shards of the blocks already analysed. 
+                block_features, _, block_valid = self.get_feature_matrix(
+                    images, extractors, n_workers=n_workers,
+                    checkpoint_folder=None if checkpoint_folder is None
+                    else os.path.join(checkpoint_folder, f'block_{block:06d}'),
+                    checkpoint_images=[current[i] for i in indexes])
+                computed.append(block_features)
+                valid.append(block_valid)
+            computed, valid = np.concatenate(computed), np.concatenate(valid)
+
+        if os.path.exists(manifest_file):
+            os.remove(manifest_file)
+        in_place = store is not None and valid.all() and np.array_equal(store.filenames, names) \
+            and store.columns == columns and store.default_columns == list(selected_columns or columns)
+        if in_place:
+            #Same images in the same order, only the changed rows are written. 
+            with PROFILER.stage('write', len(to_extract)):
+                features = np.load(os.path.join(destination_folder, 'features.npy'), mmap_mode='r+')
+                features[to_extract] = computed
+                features.flush()
+                del features
+        else:
+            rows = sorted(list(kept_rows) + [i for i, ok in zip(to_extract, valid) if ok])
+            extracted = {i: row for i, row in zip(to_extract, computed)}
+            features = np.empty((len(rows), len(columns)))
+            for j, i in enumerate(rows):
+                features[j] = store.features[kept_rows[i]] if i in kept_rows else extracted[i]
+            store = None
+            labels = [next(label for label in ImageCollection.imageLabels if label.name in names[i]) for i in rows]
+            with PROFILER.stage('write', len(rows)):
+                fs.write_feature_store(destination_folder, features, columns, labels, [names[i] for i in rows],
+                                       label_names={int(label): label.name for label in ImageCollection.imageLabels},
+                                       default_columns=selected_columns)
+        store = None
+
+        #The manifest is written last and only lists the analysed images, the failed ones are tried again next time. 
+        failed = {current[i][0] for i, ok in zip(to_extract, valid) if not ok}
+        manifest = {'extractors': settings, 'scale': self.scale,
+                    'images': {name: [size, mtime, hashes[name]] for name, size, mtime in current if name not in failed}}
+        with open(manifest_file, 'w') as file:
+            json.dump(manifest, file)
+        if resumable:
+            ckpt.clear_checkpoint(os.path.join(self.cache_folder, 'checkpoints', test_name))
+        self.write_timings(destination_folder, time.perf_counter() - start_time, snapshot)
+
+    def write_timings(self, destination_folder, wall_time, snapshot):
+        """
+        Write the time spent in each stage since snapshot (PROFILER.snapshot() taken at the start of the run) in 
+        destination_folder/timings.json, and print it if the progress is reported. 
+        The decoding done before the run, e.g. when the collection is loaded, and the earlier runs are not counted. 
+        """
+        stages = PROFILER.since(snapshot)
+        PROFILER.write_summary(os.path.join(destination_folder, 'timings.json'), wall_time, stages)
+        if self.progress:
+            PROFILER.report(wall_time, stages)
+
+    def generateRepresentation(self, input_data=None, label_test=None, data_processing=False, analyse_data=False, deocrelate_data=False, test_set=False, n_workers=1,
+                               extractors=DEFAULT_EXTRACTORS, selected_columns=None, incremental=False):
+        if data_processing and incremental:
+            #Extract features only from the new or changed images
+            self.update_feature_extraction(extractors=extractors, selected_columns=selected_columns, n_workers=n_workers)
+            print('Data processing has benn executed successusfully. Go analyse the data now...')
+        elif data_processing:
             #Extract features from images
-            self.get_feature_extraction(input_data, label_test)
+            self.get_feature_extraction(input_data, label_test, extractors=extractors, selected_columns=selected_columns,
+                                        n_workers=n_workers)
             print('Data processing has benn executed successusfully. Go analyse the data now...')
         
         if analyse_data: 
             #Produce a ClassificationData object usable by the classifiers
-            self.data3classes = ClassificationData(problematique=True)
+            self.data3classes = ClassificationData(problematique=True, columns=selected_columns)
             print('Do it for other variables...')
             print('If every variables done, do PCA.')
 
@@ -629,11 +911,7 @@ class ImageCollection:
         fig2 = plt.figure()
         ax2 = fig2.subplots(len(indexes), 1)
         for i in range(len(indexes)):
-            if self.all_images_loaded:
-                im = self.images[indexes[i]]
-            else:
-                im = skiio.imread(self.image_folder + os.sep + self.image_list[indexes[i]])
-            ax2[i].imshow(im)
+            ax2[i].imshow(self.load_image(indexes[i]))
 
     def view_histogrammes(self, indexes):
         """
@@ -651,17 +929,15 @@ class ImageCollection:
         espacement_horizontal = 0.5
         fig.subplots_adjust(hspace=espacement_vertical, wspace=espacement_horizontal)
 
+        imagesLab = self.get_color_planes(indexes, 'Lab')
+        imagesHSV = self.get_color_planes(indexes, 'HSV')
         for image_counter in range(len(indexes)):
             # charge une image si nécessaire
-            if self.all_images_loaded:
-                imageRGB = self.images[indexes[image_counter]]
-            else:
-                imageRGB = skiio.imread(
-                    self.image_folder + os.sep + self.image_list[indexes[image_counter]])
+            imageRGB = self.load_image(indexes[image_counter])
 
-            # Exemple de conversion de format pour Lab et HSV
-            imageLab = skic.rgb2lab(imageRGB)  
-            imageHSV = skic.rgb2hsv(imageRGB)  
+            # Exemple de conversion de format pour Lab et HSV, converties 1 seule fois par image
+            imageLab = imagesLab[image_counter]
+            imageHSV = imagesHSV[image_counter]
 
             # Number of bins per color channel pour les histogrammes (et donc la quantification de niveau autres formats)
             n_bins = 256
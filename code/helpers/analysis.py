@@ -1,14 +1,19 @@
 """
 Fonctions utiles pour le traitement de données
 APP2 S8 GIA
-Classe :
+Classes :
     Extent: bornes ou plage utile de données
+    ColumnScaler: normalisation min max par colonne, ajustée une fois (fit / partial_fit) et sauvegardable
+    GaussianAccumulator: moyenne et covariance calculées par lots (Welford / Chan), fusionnables entre processus
+    StratifiedSplitter: séparations stratifiées (train / validation / test, k-fold, répétées) en indices de lignes
+    SparseHistogram: densité de probabilité N-D par histogramme, seuls les bins occupés sont gardés
 
 Fonctions :
     calc_erreur_classification: localise les différences entre 2 vecteurs pris comme les étiquettes prédites et
         anticipées, calcule le taux d'erreur et affiche la matrice de confusion
 
     splitDataNN: sépare des données et des étiquettes en 2 sous-ensembles en s'assurant que chaque classe est représentée
+        (avec StratifiedSplitter)
 
     viewEllipse: ajoute une ellipse à 1 sigma sur un graphique
     view_classes: affiche sur un graphique 2D les points de plusieurs classes
@@ -16,75 +21,91 @@ Fonctions :
     printModeleGaussien: affiche les stats de base sous forme un peu plus lisible
     plot_metrics: itère et affiche toutes les métriques d'entraînement d'un RN en regroupant 1 métrique entraînement
                 + la même métrique de validation sur le même subplot
-    creer_hist2D: crée la densité de probabilité d'une série de points 2D
+    creer_hist2D: crée la densité de probabilité d'une série de points 2D (N-D: SparseHistogram)
     view3D: génère un graphique 3D de classes
 
-    calcModeleGaussien: calcule les stats de base d'une série de données
-    project_onto_new_basis: projette un espace sur une nouvelle base de vecteurs
+    calcModeleGaussien: calcule les stats de base d'une série de données, d'un array ou d'un GaussianAccumulator
+    project_onto_new_basis: projette un espace sur une nouvelle base de vecteurs, 1 produit matriciel par classe ou
+        par tranche, pour un array (N, d) avec ou sans étiquettes ou une liste de classes de tailles différentes
 
-    genDonneesTest: génère un échantillonnage aléatoire dans une plage 2D spécifiée
+    genDonneesTest: génère un échantillonnage aléatoire dans une plage N-D spécifiée
+    iter_random_probes: génère des points aléatoires uniformes dans un extent, par tranches de taille fixe
+    iter_grid_probes: génère les points d'une grille régulière sur un extent, par tranches de taille fixe
+    grid_shape: nombre de points par dimension d'une grille de iter_grid_probes
 
     scaleData: borne les min max e.g. des données d'entraînement pour les normaliser
+    scaleDataPerColumn: normalise chaque colonne entre -1 et 1 selon ses propres min max
     scaleDataKnownMinMax: normalise des données selon un min max déjà calculé
     descaleData: dénormalise des données selon un min max (utile pour dénormaliser une sortie prédite)
 """
 
+import json
+
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.patches import Ellipse
 from matplotlib import cm
 import itertools
 import math
-import random
 
 from sklearn.metrics import confusion_matrix
-from sklearn.model_selection import train_test_split as ttsplit
 
 
 class Extent:
-    # TODO Problématique ou JB, generalize to N-D
     """
-    classe pour contenir les min et max de données 2D
-    membres: xmin, xmax, ymin, ymax
-    Constructeur peut utiliser les 4 valeurs précédentes ou
-        calculer directement les min et max d'une liste de points
+    classe pour contenir les min et max de données N-D
+    membres: mins, maxs, les bornes de chaque dimension, et xmin, xmax, ymin, ymax, zmin, zmax pour les 3 premières
+    Constructeur peut utiliser les 6 valeurs précédentes (3D), les arrays mins et maxs ou
+        calculer directement les min et max d'une liste de points, de n'importe quelle dimension
     Accesseurs:
-        get_array: retourne les min max formattés en array
+        get_array: retourne les min max formattés en array, 1 ligne [min, max] par dimension
         get_corners: retourne les coordonnées des points aux coins d'un range couvert par les min max
     """
-    def __init__(self, xmin=0, xmax=10, ymin=0, ymax=10, zmin=0, zmax=10, ptList=None):
+    def __init__(self, xmin=0, xmax=10, ymin=0, ymax=10, zmin=0, zmax=10, ptList=None, mins=None, maxs=None):
         """
         Constructeur
-        2 options:
-            passer 4 arguments min et max
+        3 options:
+            passer les 6 arguments min et max
+            passer mins et maxs, les bornes de chaque dimension
             passer 1 array qui contient les des points sur lesquels sont calculées les min et max
         """
         if ptList is not None:
-            self.xmin = np.min(ptList[:,0])
-            self.xmax = np.max(ptList[:,0])
-            self.ymin = np.min(ptList[:,1])
-            self.ymax = np.max(ptList[:,1])
-            self.zmin = np.min(ptList[:,2])
-            self.zmax = np.max(ptList[:,2])
-        else:
-            self.xmin = xmin
-            self.xmax = xmax
-            self.ymin = ymin
-            self.ymax = ymax
-            self.zmin = zmin
-            self.zmax = zmax
+            ptList = np.asarray(ptList)
+            mins, maxs = np.min(ptList, axis=0), np.max(ptList, axis=0)
+        elif mins is None or maxs is None:
+            mins, maxs = [xmin, ymin, zmin], [xmax, ymax, zmax]
+        self.mins = np.asarray(mins, dtype=float).ravel()
+        self.maxs = np.asarray(maxs, dtype=float).ravel()
+        if self.mins.shape != self.maxs.shape:
+            raise ValueError(f'{len(self.mins)} minimums et {len(self.maxs)} maximums')
+
+    @property
+    def ndim(self):
+        return len(self.mins)
+
+    def _bound(self, bounds, axis, name):
+        if axis >= self.ndim:
+            raise AttributeError(f'{name}: l\'extent n\'a que {self.ndim} dimensions')
+        return bounds[axis]
+
+    xmin = property(lambda self: self._bound(self.mins, 0, 'xmin'))
+    xmax = property(lambda self: self._bound(self.maxs, 0, 'xmax'))
+    ymin = property(lambda self: self._bound(self.mins, 1, 'ymin'))
+    ymax = property(lambda self: self._bound(self.maxs, 1, 'ymax'))
+    zmin = property(lambda self: self._bound(self.mins, 2, 'zmin'))
+    zmax = property(lambda self: self._bound(self.maxs, 2, 'zmax'))
 
     def get_array(self):
         """
         Accesseur qui retourne sous format matriciel
         """
-        return [[self.xmin, self.xmax], [self.ymin, self.ymax]]
+        return np.stack([self.mins, self.maxs], axis=1).tolist()
 
     def get_corners(self):
         """
-        Accesseur qui retourne une liste points qui correspondent aux 4 coins d'un range 2D bornés par les min max
+        Accesseur qui retourne une liste points qui correspondent aux 2^N coins d'un range N-D bornés par les min max
         """
-        return np.array(list(itertools.product([self.xmin, self.xmax], [self.ymin, self.ymax])))
+        return np.array(list(itertools.product(*zip(self.mins, self.maxs))))
 
 
 def calc_erreur_classification(original_data, classified_data, gen_output=False):
@@ -102,16 +123,19 @@ def calc_erreur_classification(original_data, classified_data, gen_output=False)
     return indexes
 
 
-def calcModeleGaussien(data, message=''):
+def calcModeleGaussien(data, message='', chunk_size=None):
     """
     Calcule les stats de base de données
-    :param data: les données à traiter, devrait contenir 1 point N-D par ligne
+    :param data: les données à traiter, devrait contenir 1 point N-D par ligne,
+        ou un GaussianAccumulator déjà alimenté (e.g. par lots lus d'un stockage de caractéristiques)
     :param message: si présent, génère un affichage des stats calculées
-    :return: la moyenne, la matrice de covariance, les valeurs propres et les vecteurs propres de "data"
+    :param chunk_size: nombre de lignes traitées à la fois, toutes par défaut
+    :return: la moyenne, la matrice de covariance, les valeurs propres (croissantes) et les vecteurs propres
+        (en colonnes) de "data"
     """
-    moyenne = np.mean(data, axis=0)
-    matr_cov = np.cov(data, rowvar=False)
-    val_propres, vect_propres = np.linalg.eig(matr_cov)
+    if not isinstance(data, GaussianAccumulator):
+        data = GaussianAccumulator().update(data, chunk_size=chunk_size)
+    moyenne, matr_cov, val_propres, vect_propres = data.model()
 
     if message:
         printModeleGaussien(moyenne, matr_cov, val_propres, vect_propres, message)
@@ -180,14 +204,122 @@ def descaleData(x, minmax):
     return y
 
 
-def genDonneesTest(ndonnees, extent):
-    # génération de n données aléatoires 2D sur une plage couverte par extent
-    np_ndonnees = np.asarray(ndonnees)
-    x = (extent.xmax - extent.xmin) * np.random.random(ndonnees) + extent.xmin
-    y = (extent.ymax - extent.ymin) * np.random.random(ndonnees) + extent.ymin
-    z = (extent.zmax - extent.zmin) * np.random.random(ndonnees) + extent.zmin
+class SparseHistogram:
+    """
+    Densité de probabilité N-D par histogramme, bins réguliers sur l'extent des données d'entraînement
+    comme creer_hist2D (la dernière frontière est incluse). Seuls les bins occupés sont gardés : chaque bin est
+    identifié par une clé entière calculée de ses coordonnées entières (index linéaire), les clés sont triées
+    et la recherche d'un lot de points se fait par np.searchsorted. La mémoire dépend du nombre de bins occupés,
+    pas de n_bins ** dimensions.
+    n_bins: nombre de bins par dimension, entier ou 1 entier par dimension
+    extent: plage couverte par l'histogramme, celle des données de fit par défaut
+    """
+    def __init__(self, n_bins=15, extent=None):
+        self.n_bins = n_bins
+        self.extent = extent
+        self.shape = None
+        self.width = None
+        self.keys = None
+        self.values = None
+
+    def fit(self, data):
+        """
+        Compte les points de data (n, d) par bin, la densité d'un bin est compte / (n * volume du bin)
+        """
+        data = np.asarray(data, dtype=float)
+        if self.extent is None:
+            self.extent = Extent(ptList=data)
+        self.shape = np.broadcast_to(np.asarray(self.n_bins, dtype=np.int64), (self.extent.ndim,)).copy()
+        if np.prod(self.shape.astype(float)) >= 2 ** 63:
+            raise ValueError(f'{self.shape.tolist()} bins: trop de bins pour des clés de 64 bits')
+        span = self.extent.maxs - self.extent.mins
+        self.width = np.where(span > 0, span, 1.) / self.shape
+        keys, inside = self._keys(data)
+        self.keys, counts = np.unique(keys[inside], return_counts=True)
+        self.values = counts / (len(data) * np.prod(self.width))
+        return self
+
+    def _keys(self, points):
+        """
+        Clé du bin de chaque point et masque des points dans l'extent
+        """
+        if points.ndim != 2 or points.shape[1] != len(self.shape):
+            raise ValueError(f'Points {points.shape} incompatibles avec un histogramme {len(self.shape)}-D')
+        coordinates = np.floor((points - self.extent.mins) / self.width).astype(np.int64)
+        # La borne supérieure de l'extent appartient au dernier bin
+        coordinates[(coordinates == self.shape) & (points <= self.extent.maxs)] -= 1
+        inside = ((coordinates >= 0) & (coordinates < self.shape)).all(axis=1)
+        coordinates[~inside] = 0
+        return np.ravel_multi_index(coordinates.T, self.shape), inside
+
+    def density(self, points, chunk_size=65536):
+        """
+        Densité de probabilité de chaque point (n, d), 0 hors de l'extent ou dans un bin vide
+        :param chunk_size: nombre de points traités à la fois, borne la mémoire des grands lots
+        """
+        if self.keys is None:
+            raise ValueError('L\'histogramme doit être ajusté (fit) avant d\'être utilisé')
+        points = np.asarray(points, dtype=float)
+        result = np.zeros(len(points))
+        for start in range(0, len(points), chunk_size):
+            keys, inside = self._keys(points[start:start + chunk_size])
+            position = np.searchsorted(self.keys, keys).clip(max=max(len(self.keys) - 1, 0))
+            found = inside & (self.keys[position] == keys) if len(self.keys) else np.zeros(len(keys), dtype=bool)
+            result[start:start + len(keys)][found] = self.values[position[found]]
+        return result
+
+    @property
+    def n_occupied(self):
+        return 0 if self.keys is None else len(self.keys)
+
+
+def genDonneesTest(ndonnees, extent, seed=None):
+    # génération de n données aléatoires N-D sur une plage couverte par extent, 1 colonne par dimension de l'extent
+    return np.concatenate(list(iter_random_probes(extent, ndonnees, seed=seed)) or [np.empty((0, extent.ndim))])
+
+
+def iter_random_probes(extent, n_points, chunk_size=65536, seed=None):
+    """
+    Points aléatoires uniformes dans la plage couverte par extent, produits par tranches
+    :param n_points: nombre total de points
+    :param chunk_size: nombre maximal de points par tranche, borne la mémoire utilisée
+    :param seed: graine du générateur, aléatoire si None
+    :return: générateur d'arrays (≤ chunk_size, extent.ndim)
+    """
+    rng = np.random.default_rng(seed)
+    span = extent.maxs - extent.mins
+    for start in range(0, n_points, chunk_size):
+        points = rng.random((min(chunk_size, n_points - start), extent.ndim))
+        points *= span
+        points += extent.mins
+        yield points
+
 
-    return np.vstack((x, y, z)).T
+def grid_shape(extent, resolution):
+    """
+    Nombre de points de la grille dans chaque dimension, resolution est un entier ou 1 entier par dimension
+    """
+    shape = np.broadcast_to(np.asarray(resolution, dtype=int), (extent.ndim,))
+    if (shape < 1).any():
+        raise ValueError(f'Résolution invalide: {resolution}')
+    return tuple(int(n) for n in shape)
+
+
+def iter_grid_probes(extent, resolution, chunk_size=65536):
+    """
+    Points d'une grille régulière sur extent (bornes incluses, comme np.linspace), dans l'ordre C de
+    np.meshgrid(..., indexing='ij') : les prédictions concaténées se remettent en carte avec
+    .reshape(grid_shape(extent, resolution)). Seule une tranche de points existe à la fois.
+    :param resolution: nombre de points par dimension, entier ou 1 entier par dimension
+    :param chunk_size: nombre maximal de points par tranche
+    :return: générateur d'arrays (≤ chunk_size, extent.ndim)
+    """
+    shape = grid_shape(extent, resolution)
+    axes = [np.linspace(low, high, n) for low, high, n in zip(extent.mins, extent.maxs, shape)]
+    n_points = int(np.prod(shape))
+    for start in range(0, n_points, chunk_size):
+        indexes = np.unravel_index(np.arange(start, min(start + chunk_size, n_points)), shape)
+        yield np.stack([axis[index] for axis, index in zip(axes, indexes)], axis=1)
 
 
 def plot_metrics(NNmodel):
@@ -241,26 +373,57 @@ def printModeleGaussien(moyenne, matr_cov, val_propres, vect_propres, message=''
     print(f'Moy: {moyenne} \nCov: {matr_cov} \nVal prop: {val_propres} \nVect prop: {vect_propres}\n')
 
     
-def project_onto_new_basis(data, basis):
+def project_onto_new_basis(data, basis, labels=None, out=None, chunk_size=None):
     """
     Projette les données sur une nouvelle base.
-    :param data: Données à projeter, avec la forme (n_classes, n_échantillons, n_variables).
+    :param data: Données à projeter, sous l'une des formes :
+        (n_classes, n_échantillons, n_variables), comme dataLists quand les classes ont la même taille,
+        liste de classes (n_échantillons_i, n_variables) de tailles différentes,
+        (N, n_variables), e.g. data1array, avec ou sans labels.
     :param basis: Vecteurs de la nouvelle base (vecteurs propres), avec la forme (n_variables, n_nouvelles_variables).
-    :return: Données projetées, avec la forme (n_classes, n_échantillons, n_nouvelles_variables).
+    :param labels: étiquette de chaque ligne de data (N, n_variables), e.g. labels1array, pour obtenir 1 array par classe
+    :param out: array (N total, n_nouvelles_variables) préalloué où écrire la projection, e.g. un memmap
+    :param chunk_size: nombre de lignes projetées par produit matriciel, pour les très grands arrays (e.g. memmap)
+    :return: Données projetées, avec la forme de data et n_nouvelles_variables colonnes :
+        (n_classes, n_échantillons, n_nouvelles_variables), liste de classes (vues dans out),
+        (N, n_nouvelles_variables), ou la liste des classes dans l'ordre croissant des étiquettes si labels est donné.
     """
-    # Vérifier la cohérence des dimensions
-    assert data.shape[2] == basis.shape[0], "Le nombre de variables dans 'data' doit correspondre au nombre de lignes dans 'basis'."
-
-    # Initialiser la matrice pour stocker les données projetées
-    projected = np.zeros((data.shape[0], data.shape[1], basis.shape[1]))
-
-    # Projeter les données pour chaque classe
-    for i in range(data.shape[0]):  # Itérer sur les classes
-        for j in range(data.shape[1]):  # Itérer sur les échantillons dans la classe
-            # Projeter chaque échantillon sur la nouvelle base
-            projected[i, j] = np.dot(data[i, j], basis)
-
-    return projected
+    basis = np.asarray(basis)
+    if isinstance(data, (list, tuple)):
+        parts = [np.asarray(part) for part in data]
+    else:
+        data = np.asarray(data)
+        if data.ndim not in (2, 3):
+            raise ValueError(f'Les données doivent être 2D ou 3D, pas {data.shape}')
+        parts = list(data) if data.ndim == 3 else [data]
+    for part in parts:
+        if part.ndim != 2 or part.shape[1] != basis.shape[0]:
+            raise ValueError(f'Données {part.shape} incompatibles avec une base de {basis.shape[0]} variables')
+
+    n_rows = sum(len(part) for part in parts)
+    if out is None:
+        dtype = np.result_type(basis.dtype, *(part.dtype for part in parts), np.float32)
+        out = np.empty((n_rows, basis.shape[1]), dtype=dtype)
+    elif out.shape != (n_rows, basis.shape[1]):
+        raise ValueError(f'out doit avoir la forme {(n_rows, basis.shape[1])}, pas {out.shape}')
+
+    # 1 produit matriciel par classe, ou par tranche de chunk_size lignes, écrit directement dans out
+    start = 0
+    for part in parts:
+        step = chunk_size or max(len(part), 1)
+        for row in range(0, len(part), step):
+            chunk = part[row:row + step]
+            np.matmul(chunk, basis, out=out[start + row:start + row + len(chunk)])
+        start += len(part)
+
+    if isinstance(data, (list, tuple)):
+        return np.split(out, np.cumsum([len(part) for part in parts])[:-1])
+    if data.ndim == 3:
+        return out.reshape(data.shape[0], data.shape[1], basis.shape[1])
+    if labels is not None:
+        labels = np.asarray(labels).ravel()
+        return [out[labels == label] for label in np.unique(labels)]
+    return out
 
 
 def rescaleHistLab(LabImage, n_bins=256):
@@ -275,15 +438,15 @@ def rescaleHistLab(LabImage, n_bins=256):
         min_ab: int = -110
         max_ab: int = 110
 
-    # Création d'une image vide
+    # Création d'une image vide, fonctionne aussi pour un lot d'images (N, H, W, 3)
     imageLabRescale = np.zeros(LabImage.shape)
     # Quantification de L en n_bins niveaux     # TODO JB : utiliser scaleData?
-    imageLabRescale[:, :, 0] = np.round(
-        (LabImage[:, :, 0] - LabCte.min_L) * (n_bins - 1) / (
+    imageLabRescale[..., 0] = np.round(
+        (LabImage[..., 0] - LabCte.min_L) * (n_bins - 1) / (
                 LabCte.max_L - LabCte.min_L))  # L has all values between 0 and 100
     # Quantification de a et b en n_bins niveaux
-    imageLabRescale[:, :, 1:3] = np.round(
-        (LabImage[:, :, 1:3] - LabCte.min_ab) * (n_bins - 1) / (
+    imageLabRescale[..., 1:3] = np.round(
+        (LabImage[..., 1:3] - LabCte.min_ab) * (n_bins - 1) / (
                 LabCte.max_ab - LabCte.min_ab))  # a and b have all values between -110 and 110
     return imageLabRescale
 
@@ -299,78 +462,286 @@ def scaleDataPerColumn(x):
     Normalise the data between -1 and 1 and normalised based on the channels which is 
     a normalisation done on every variables indivisually. This is done to make sure the
     normalisation has been done with same mesuerement units. 
+    Return the scaled data and the (min, max) of each column, see ColumnScaler to reuse them. 
     """
-    y = np.zeros_like(x)  # Initialiser une nouvelle matrice de la même forme que x
-    minmax_per_column = []
-    
-    for i in range(x.shape[1]):  # x.shape[1] est le nombre de colonnes
-        col_min = np.min(x[:, i])
-        col_max = np.max(x[:, i])
-        minmax_per_column.append((col_min, col_max))
-        
-        # Appliquer la transformation de normalisation à chaque colonne individuellement
-        y[:, i] = 2.0 * (x[:, i] - col_min) / (col_max - col_min) - 1
-    
-    return y, minmax_per_column
+    scaler = ColumnScaler().fit(x)
+    return scaler.transform(x), [tuple(minmax) for minmax in zip(scaler.data_min, scaler.data_max)]
 
 
 def scaleDataKnownMinMax(x, minmax):
-    # todo JB assert dimensions
-    # mean = np.mean(x, axis=0)
-    # std = np.std(x, axis=0)
-    # y = (x - mean) / std
-    minmax = (np.min(x), np.max(x))
-    y = 2.0 * (x - minmax[0]) / (minmax[1] - minmax[0]) - 1
-    return y
+    """
+    Normalise des données entre -1 et 1 selon un min max déjà calculé, e.g. sur les données d'entraînement
+    :param minmax: (min, max) global, liste de (min, max) par colonne comme retournée par scaleDataPerColumn,
+        ou un ColumnScaler déjà ajusté
+    """
+    if isinstance(minmax, ColumnScaler):
+        return minmax.transform(x)
+    minmax = np.asarray(minmax, dtype=float)
+    if minmax.ndim == 1:
+        return 2.0 * (np.asarray(x) - minmax[0]) / (minmax[1] - minmax[0]) - 1
+    return ColumnScaler.from_minmax(minmax[:, 0], minmax[:, 1]).transform(x)
 
 
-def splitDataNN(n_classes, data, labels, train_fraction=0.8):
-    # Split into train and validation subsets
-    # This is overly complicated because in order to ensure that each class is represented in split sets,
-    #   we have to split each class separately
-    # The classes are shuffled individually first just in case all similar cases are regrouped in the original class data
-    # The classes will be ordered in the resulting list, so we shuffle them even if shuffle=True is used
-    # during training, this is more robust if eventually that option ends up not used
-
-    traindataLists = []
-    trainlabelsLists = []
-    validdataLists = []
-    validlabelsLists = []
-    for i in range(n_classes):
-        # The only datatype easy to shuffle starting with an array_like is a list, but we also have to ensure
-        # that data and labels are shuffled together!!
-        classData = list(zip(data[i], labels[i]))
-        random.shuffle(classData)
-        shuffledData, shuffledLabels = zip(*classData)
-        shuffledData = list(shuffledData)  # why does zip not return a specifiable datatype directly
-        shuffledLabels = list(shuffledLabels)
-        # split into subsets
-        training_data, validation_data, training_target, validation_target = \
-            ttsplit(shuffledData, shuffledLabels, train_size=train_fraction)
-        traindataLists.append(training_data)
-        trainlabelsLists.append(training_target)
-        validdataLists.append(validation_data)
-        validlabelsLists.append(validation_target)
-
-    # Merge all class splits into 1 contiguous array
-    new_traindataLists = np.vstack(traindataLists)
-    new_trainlabelsLists = np.vstack(trainlabelsLists)
-    # Reshuffle the completed array just for good measure
-    trainData = list(zip(new_traindataLists, new_trainlabelsLists))
-    random.shuffle(trainData)
-    shuffledTrainData, shuffledTrainLabels = zip(*trainData)
-    shuffledTrainData = np.array(list(shuffledTrainData))
-    shuffledTrainLabels = np.array(list(shuffledTrainLabels))
-
-    new_validdataLists = np.vstack(validdataLists)
-    new_validlabelsLists = np.vstack(validlabelsLists)
-    validData = list(zip(new_validdataLists, new_validlabelsLists))
-    random.shuffle(validData)
-    shuffledValidData, shuffledValidLabels = zip(*validData)
-    shuffledValidData = np.array(list(shuffledValidData))
-    shuffledValidLabels = np.array(list(shuffledValidLabels))
-
-    return shuffledTrainData, shuffledTrainLabels, shuffledValidData, shuffledValidLabels
+class GaussianAccumulator:
+    """
+    Moyenne et matrice de covariance d'un flux de données N-D, lot par lot
+    Garde le nombre de points n, la moyenne et la somme des produits des écarts à la moyenne (m2, d x d) :
+    chaque lot est centré sur sa propre moyenne puis combiné avec la formule de Chan et al.,
+    sans la perte de précision de sum(x²) - n * moyenne².
+    Deux accumulateurs (e.g. 2 processus ou 2 tranches) se fusionnent exactement avec merge.
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = None
+        self.m2 = None
+
+    def _combine(self, n, mean, m2):
+        if not n:
+            return self
+        if self.mean is None:
+            self.n, self.mean, self.m2 = n, mean, m2
+            return self
+        if mean.shape != self.mean.shape:
+            raise ValueError(f'{mean.shape[0]} colonnes, l\'accumulateur en a {self.mean.shape[0]}')
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + m2 + np.outer(delta, delta) * (self.n * n / total)
+        self.n = total
+        return self
+
+    def update(self, x, chunk_size=None):
+        """
+        Ajoute un lot de données (n, d), traité par tranches de chunk_size lignes si donné
+        """
+        x = np.asarray(x)
+        if x.ndim != 2:
+            raise ValueError(f'Les données doivent être 2D (n, d), pas {x.shape}')
+        step = chunk_size or max(len(x), 1)
+        for start in range(0, len(x), step):
+            batch = np.asarray(x[start:start + step], dtype=np.float64)
+            mean = batch.mean(axis=0)
+            centered = batch - mean
+            self._combine(len(batch), mean, centered.T @ centered)
+        return self
+
+    def merge(self, other):
+        """
+        Ajoute les données d'un autre accumulateur, le résultat est celui d'un seul accumulateur sur toutes les données
+        """
+        if other.mean is not None:
+            self._combine(other.n, other.mean.copy(), other.m2.copy())
+        return self
+
+    @classmethod
+    def merged(cls, accumulators):
+        result = cls()
+        for accumulator in accumulators:
+            result.merge(accumulator)
+        return result
+
+    def covariance(self, ddof=1):
+        """
+        Matrice de covariance, non biaisée par défaut comme np.cov
+        """
+        if self.n <= ddof:
+            raise ValueError(f'{self.n} points, pas assez pour une covariance avec ddof={ddof}')
+        return self.m2 / (self.n - ddof)
+
+    def model(self, ddof=1):
+        """
+        La moyenne, la covariance, ses valeurs propres (croissantes, réelles) et ses vecteurs propres (en colonnes)
+        La covariance est symétrique : np.linalg.eigh plutôt que np.linalg.eig
+        """
+        covariance = self.covariance(ddof)
+        val_propres, vect_propres = np.linalg.eigh(covariance)
+        return self.mean.copy(), covariance, val_propres, vect_propres
+
+
+class ColumnScaler:
+    """
+    Normalisation min max de chaque colonne vers feature_range, e.g. (-1, 1)
+    Les paramètres sont ajustés 1 fois sur les données d'entraînement (fit, ou partial_fit par lots) puis appliqués
+    tels quels aux nouvelles données : y = x * scale + offset, 1 multiplication et 1 addition par valeur.
+    Une colonne constante est envoyée au bas de feature_range.
+    Sauvegarde avec save / load en JSON, à côté d'un modèle.
+    """
+    def __init__(self, feature_range=(-1, 1)):
+        self.feature_range = tuple(feature_range)
+        self.data_min = None
+        self.data_max = None
+        self.scale = None
+        self.offset = None
+
+    @classmethod
+    def from_minmax(cls, data_min, data_max, feature_range=(-1, 1)):
+        scaler = cls(feature_range)
+        scaler.data_min = np.asarray(data_min, dtype=float)
+        scaler.data_max = np.asarray(data_max, dtype=float)
+        scaler._update()
+        return scaler
+
+    def _update(self):
+        low, high = self.feature_range
+        span = self.data_max - self.data_min
+        span = np.where(span == 0, 1., span)
+        self.scale = (high - low) / span
+        self.offset = low - self.data_min * self.scale
+
+    def partial_fit(self, x):
+        """
+        Ajoute un lot de données (n, d) aux min max déjà vus
+        """
+        x = np.asarray(x)
+        data_min, data_max = np.min(x, axis=0).astype(float), np.max(x, axis=0).astype(float)
+        if self.data_min is not None:
+            if data_min.shape != self.data_min.shape:
+                raise ValueError(f'{data_min.shape[0]} colonnes, le scaler a été ajusté sur {self.data_min.shape[0]}')
+            data_min, data_max = np.minimum(self.data_min, data_min), np.maximum(self.data_max, data_max)
+        self.data_min, self.data_max = data_min, data_max
+        self._update()
+        return self
+
+    def fit(self, x):
+        self.data_min = None
+        self.data_max = None
+        return self.partial_fit(x)
+
+    def _check(self, x):
+        if self.scale is None:
+            raise ValueError('Le scaler doit être ajusté (fit) avant d\'être utilisé')
+        if np.shape(x)[-1] != len(self.scale):
+            raise ValueError(f'{np.shape(x)[-1]} colonnes, le scaler a été ajusté sur {len(self.scale)}')
+
+    def transform(self, x, copy=True):
+        """
+        Normalise x (n, d), en place si copy=False et que x est déjà un array float (e.g. float32)
+        """
+        self._check(x)
+        x = np.asarray(x)
+        if copy or not np.issubdtype(x.dtype, np.floating):
+            x = np.array(x, dtype=np.result_type(x.dtype, np.float32))
+        x *= self.scale.astype(x.dtype)
+        x += self.offset.astype(x.dtype)
+        return x
+
+    def inverse_transform(self, y, copy=True):
+        """
+        Ramène des données normalisées dans les unités d'origine
+        """
+        self._check(y)
+        y = np.asarray(y)
+        if copy or not np.issubdtype(y.dtype, np.floating):
+            y = np.array(y, dtype=np.result_type(y.dtype, np.float32))
+        y -= self.offset.astype(y.dtype)
+        y /= self.scale.astype(y.dtype)
+        return y
+
+    def fit_transform(self, x, copy=True):
+        return self.fit(x).transform(x, copy=copy)
+
+    def to_dict(self):
+        return {'feature_range': list(self.feature_range),
+                'data_min': self.data_min.tolist(), 'data_max': self.data_max.tolist()}
+
+    @classmethod
+    def from_dict(cls, parameters):
+        return cls.from_minmax(parameters['data_min'], parameters['data_max'], parameters['feature_range'])
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            return cls.from_dict(json.load(file))
+
+
+def splitDataNN(n_classes, data, labels, train_fraction=0.8, seed=None):
+    """
+    Sépare des données en sous-ensembles d'entraînement et de validation, chaque classe séparée selon train_fraction
+    Seuls des indices sont mélangés (StratifiedSplitter), les données sont copiées 1 fois par sous-ensemble.
+    :param data: liste des données de chaque classe, (n_échantillons_i, n_variables)
+    :param labels: liste des étiquettes de chaque classe, e.g. encodées one-hot, (n_échantillons_i, ...)
+    :param seed: graine du mélange, aléatoire si None
+    :return: données et étiquettes d'entraînement, données et étiquettes de validation, classes mélangées entre elles
+    """
+    data1array, labels1array = np.vstack(data[:n_classes]), np.vstack(labels[:n_classes])
+    classes = np.repeat(np.arange(n_classes), [len(class_data) for class_data in data[:n_classes]])
+    train, _, valid = StratifiedSplitter(classes, seed).split(train_fraction)
+    return data1array[train], labels1array[train], data1array[valid], labels1array[valid]
+
+
+class StratifiedSplitter:
+    """
+    Séparations stratifiées des lignes d'un jeu de données, sans toucher aux données :
+    chaque classe est mélangée puis découpée, le résultat est des arrays d'indices de lignes (data[indices]).
+    Le coût ne dépend que du nombre de lignes, pas du nombre de colonnes.
+    labels: étiquette de chaque ligne, (N,), (N, 1) ou encodée one-hot (N, n_classes)
+    seed: graine du générateur, les séparations successives d'un même splitter sont différentes mais reproductibles
+    """
+    def __init__(self, labels, seed=None):
+        labels = np.asarray(labels)
+        if labels.ndim == 2 and labels.shape[1] > 1:
+            labels = np.argmax(labels, axis=1)
+        self.classes, classes = np.unique(labels.ravel(), return_inverse=True)
+        self.n_rows = len(classes)
+        self.rng = np.random.default_rng(seed)
+        # Lignes de chaque classe, dans l'ordre d'origine
+        order = np.argsort(classes, kind='stable')
+        self.class_rows = np.split(order, np.cumsum(np.bincount(classes, minlength=len(self.classes)))[:-1])
+
+    def _join(self, parts, shuffle):
+        rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
+        return self.rng.permutation(rows) if shuffle else np.sort(rows)
+
+    def split(self, train_fraction=0.8, valid_fraction=0., shuffle=True):
+        """
+        Sépare chaque classe en train_fraction pour l'entraînement, valid_fraction pour la validation et le reste
+        pour le test (arrondis vers le bas comme sklearn train_test_split)
+        :param shuffle: mélange les classes entre elles, sinon les indices sont croissants
+        :return: les indices (train, validation, test)
+        """
+        if train_fraction < 0 or valid_fraction < 0 or train_fraction + valid_fraction > 1:
+            raise ValueError(f'Fractions invalides: entraînement {train_fraction}, validation {valid_fraction}')
+        train, valid, test = [], [], []
+        for rows in self.class_rows:
+            rows = self.rng.permutation(rows)
+            n_train = int(np.floor(train_fraction * len(rows)))
+            n_valid = int(np.floor(valid_fraction * len(rows)))
+            train.append(rows[:n_train])
+            valid.append(rows[n_train:n_train + n_valid])
+            test.append(rows[n_train + n_valid:])
+        return self._join(train, shuffle), self._join(valid, shuffle), self._join(test, shuffle)
+
+    def kfold(self, n_folds=5, shuffle=True):
+        """
+        Validation croisée stratifiée : chaque classe est découpée en n_folds parts presque égales
+        :return: générateur de n_folds (indices d'entraînement, indices de test), chaque ligne est testée 1 fois
+        """
+        if n_folds < 2:
+            raise ValueError(f'Au moins 2 parts sont nécessaires, pas {n_folds}')
+        folds = [np.array_split(self.rng.permutation(rows), n_folds) for rows in self.class_rows]
+        for fold in range(n_folds):
+            train = [part for class_folds in folds for i, part in enumerate(class_folds) if i != fold]
+            test = [class_folds[fold] for class_folds in folds]
+            yield self._join(train, shuffle), self._join(test, shuffle)
+
+    def repeated(self, n_repeats, train_fraction=0.8, valid_fraction=0., shuffle=True):
+        """
+        n_repeats séparations indépendantes (train, validation, test), e.g. pour moyenner un taux d'erreur
+        """
+        for _ in range(n_repeats):
+            yield self.split(train_fraction, valid_fraction, shuffle)
+
+    def repeated_kfold(self, n_repeats, n_folds=5, shuffle=True):
+        """
+        n_repeats validations croisées, chacune avec un nouveau découpage
+        :return: générateur de n_repeats * n_folds (indices d'entraînement, indices de test)
+        """
+        for _ in range(n_repeats):
+            yield from self.kfold(n_folds, shuffle)
 
 
 def view3D(data3D, targets, title):
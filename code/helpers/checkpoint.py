@@ -0,0 +1,73 @@
+"""
+Points de reprise de l'extraction des caractéristiques de la problématique
+APP2 S8 GIA
+Les résultats sont écrits par tranches (shards) d'images dès qu'elles sont terminées :
+    description.json: ce qui est extrait (extracteurs, images, taille des tranches), écrit au début
+    shard_<début>.npz: les caractéristiques et les échecs d'une tranche, renommé une fois complet
+Une extraction relancée avec la même description saute les tranches déjà écrites.
+Une description différente efface les anciennes tranches.
+
+Classe :
+    ExtractionCheckpoint: dossier de points de reprise d'une extraction
+
+Fonction :
+    clear_checkpoint: efface un dossier de points de reprise
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+class ExtractionCheckpoint:
+    """
+    Dossier de points de reprise d'une extraction
+    folder: dossier des tranches
+    description: dictionnaire sérialisable en JSON qui identifie l'extraction, e.g. extracteurs et images
+    """
+    def __init__(self, folder, description):
+        self.folder = folder
+        self.description = json.loads(json.dumps(description, default=lambda value: np.asarray(value).tolist()))
+        description_file = os.path.join(folder, 'description.json')
+        if os.path.exists(description_file):
+            with open(description_file) as file:
+                if json.load(file) != self.description:
+                    print(f'The checkpoint in {folder} belongs to another extraction, it is erased.')
+                    shutil.rmtree(folder)
+        if not os.path.exists(description_file):
+            os.makedirs(folder, exist_ok=True)
+            with open(description_file, 'w') as file:
+                json.dump(self.description, file)
+
+    def get_file(self, start):
+        return os.path.join(self.folder, f'shard_{start:09d}.npz')
+
+    def load(self, start):
+        """
+        Résultat d'une tranche terminée, (start, features, failures), ou None
+        """
+        if not os.path.exists(self.get_file(start)):
+            return None
+        with np.load(self.get_file(start)) as data:
+            failures = [(int(i), str(error)) for i, error in zip(data['failed_indexes'], data['failed_errors'])]
+            return start, data['features'], failures
+
+    def commit(self, start, features, failures):
+        """
+        Écrit une tranche, le fichier n'apparaît qu'une fois complet
+        """
+        temporary_file = self.get_file(start) + '.tmp.npz'
+        np.savez(temporary_file, features=features,
+                 failed_indexes=np.array([i for i, _ in failures], dtype=np.int64),
+                 failed_errors=np.array([error for _, error in failures], dtype=str))
+        os.replace(temporary_file, self.get_file(start))
+
+
+def clear_checkpoint(folder):
+    """
+    Efface le dossier de points de reprise, une fois l'extraction complète écrite ailleurs
+    Ne demande pas la description de l'extraction, contrairement à ExtractionCheckpoint
+    """
+    shutil.rmtree(folder, ignore_errors=True)
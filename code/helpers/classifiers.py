@@ -100,22 +100,22 @@ class GaussianProbDensity:
 class histProbDensity:
     """
     Classe "virtuelle" appelée par BayesClassifier
-    Modèle de classe arbitraire (histogramme)
-    Fonctionne juste pour une représentation 2D pour l'instant
+    Modèle de classe arbitraire (histogramme N-D creux, an.SparseHistogram)
     Train intégré dans le constructeur
     Predict à part -> computeProbaility
     """
-    def __init__(self, data2train, title='', view=False):
-        _, self.representationDimensions = np.asarray(data2train).shape
-        self.extent = data2train.extent
-        # TODO problématique: modifier la modélisation pour fonctionner avec une dimensionalité plus élevée
-        self.hist, self.xedges, self.yedges = an.creer_hist2D(data2train, title=title, view=view)
+    def __init__(self, data2train, title='', view=False, n_bins=15):
+        data2train = np.asarray(data2train)
+        _, self.representationDimensions = data2train.shape
+        self.extent = an.Extent(ptList=data2train)
+        self.hist = an.SparseHistogram(n_bins, self.extent).fit(data2train)
+        if view and self.representationDimensions == 2:
+            an.creer_hist2D(data2train, title=title, nbinx=n_bins, nbiny=n_bins, view=view)
 
     def computeProbability(self, testdata1array):
         testDataNSamples, testDataDimensions = np.asarray(testdata1array).shape
         assert testDataDimensions == self.representationDimensions
-        raise NotImplementedError()
-        return  # something to be computed
+        return self.hist.density(testdata1array)
 
 #############################################################################
 # Good morning Bayes
@@ -0,0 +1,128 @@
+"""
+Cache des caractéristiques par image de la problématique
+APP2 S8 GIA
+Les caractéristiques sont adressées par le contenu de l'image : une entrée est identifiée par
+(hash de l'image, nom de l'extracteur, paramètres, version du code de l'extracteur).
+Chaque (extracteur, paramètres, version) a son fichier .npz qui contient les hash des images et leurs lignes,
+un nouvel essai qui ajoute un extracteur ne calcule donc que les nouvelles colonnes.
+La taille totale est bornée : les entrées les moins récemment utilisées sont effacées en premier.
+
+Classe :
+    FeatureCache: cache sur disque, dans un dossier, avec une taille maximale en octets
+
+Fonctions :
+    image_hashes: hash du contenu de chaque image d'un lot
+    extractor_key: clé d'un extracteur, de ses paramètres et de sa version
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+
+def image_hashes(images):
+    """
+    Hash blake2b du contenu (pixels, forme et type) de chaque image
+    :return: array de chaînes de 32 caractères hexadécimaux, une par image
+    """
+    hashes = []
+    for image in images:
+        image = np.ascontiguousarray(image)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'{image.shape}{image.dtype.str}'.encode())
+        digest.update(image.data)
+        hashes.append(digest.hexdigest())
+    return np.array(hashes, dtype='U32')
+
+
+def extractor_key(name, params, version):
+    """
+    Clé d'une entrée de la cache, les paramètres sont sérialisés en JSON trié (tuples et listes sont équivalents)
+    :return: la clé (hash hexadécimal) et sa description
+    """
+    description = {'name': name, 'params': params, 'version': version}
+    text = json.dumps(description, sort_keys=True, default=lambda value: np.asarray(value).tolist())
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest(), json.loads(text)
+
+
+class FeatureCache:
+    """
+    Cache des caractéristiques par image, un fichier .npz par extracteur et un index JSON
+    folder: dossier de la cache
+    max_bytes: taille maximale des fichiers de la cache, en octets
+    """
+    def __init__(self, folder, max_bytes=2**30):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(folder, 'index.json')
+        os.makedirs(folder, exist_ok=True)
+        self.index = {}
+        if os.path.exists(self.index_file):
+            with open(self.index_file) as file:
+                self.index = json.load(file)
+            # Oublie les entrées dont le fichier a disparu
+            self.index = {key: entry for key, entry in self.index.items() if os.path.exists(self.get_file(key))}
+
+    def get_file(self, key):
+        return os.path.join(self.folder, f'{key}.npz')
+
+    def load(self, key, hashes):
+        """
+        Lit les lignes des images demandées
+        :return: les valeurs (len(hashes), n_colonnes), nan si absentes, et le masque des images trouvées
+        """
+        if key not in self.index:
+            return None, np.zeros(len(hashes), dtype=bool)
+        with np.load(self.get_file(key)) as data:
+            cached_hashes, cached_values = data['hashes'], data['values']
+        order = np.argsort(cached_hashes)
+        position = np.searchsorted(cached_hashes, hashes, sorter=order).clip(max=len(cached_hashes) - 1)
+        rows = order[position]
+        found = cached_hashes[rows] == hashes
+        values = np.full((len(hashes), cached_values.shape[1]), np.nan)
+        values[found] = cached_values[rows[found]]
+        self.index[key]['last_used'] = time.time()
+        return values, found
+
+    def store(self, key, description, hashes, values):
+        """
+        Ajoute les lignes calculées à l'entrée de l'extracteur, les lignes qui contiennent des nan sont ignorées
+        """
+        keep = ~np.isnan(values).any(axis=1)
+        hashes, values = np.asarray(hashes)[keep], np.asarray(values, dtype=float)[keep]
+        if key in self.index:
+            with np.load(self.get_file(key)) as data:
+                new = ~np.isin(hashes, data['hashes'])
+                hashes = np.concatenate([data['hashes'], hashes[new]])
+                values = np.concatenate([data['values'], values[new]])
+        if not len(hashes):
+            return
+        # Écrit dans un fichier temporaire pour ne jamais laisser une entrée à moitié écrite
+        temporary_file = self.get_file(key) + '.tmp.npz'
+        np.savez(temporary_file, hashes=hashes, values=values)
+        os.replace(temporary_file, self.get_file(key))
+        self.index[key] = {**description, 'rows': len(hashes), 'size': os.path.getsize(self.get_file(key)),
+                           'last_used': time.time()}
+        self.evict()
+
+    def evict(self):
+        """
+        Efface les entrées les moins récemment utilisées jusqu'à respecter max_bytes
+        """
+        total = sum(entry['size'] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda key: self.index[key]['last_used']):
+            if total <= self.max_bytes:
+                break
+            total -= self.index[key]['size']
+            os.remove(self.get_file(key))
+            del self.index[key]
+
+    def save(self):
+        """
+        Écrit l'index, à appeler après une série de load / store
+        """
+        with open(self.index_file, 'w') as file:
+            json.dump(self.index, file, indent=1)
@@ -0,0 +1,367 @@
+"""
+Registre des extracteurs de caractéristiques de la problématique
+APP2 S8 GIA
+Chaque extracteur est enregistré sous un nom avec les colonnes qu'il produit, ses paramètres par défaut et les
+résultats intermédiaires dont il a besoin (INTERMEDIATES, e.g. 'gray_u8', 'gray_f64', 'sobel_gx', 'lab', 'hsv').
+Un intermédiaire est calculé 1 seule fois par lot, à la première demande, et libéré après son dernier utilisateur.
+Une extraction prend une liste de noms (ou de tuples (nom, paramètres)) et remplit directement une matrice
+(n_images, n_caractéristiques) préallouée, dont le schéma est la liste ordonnée des noms de colonnes.
+
+Classes :
+    FeatureExtractor: un extracteur enregistré, nom + fonction + colonnes + paramètres par défaut
+    ImageBatch: un lot d'images et ses intermédiaires, partagés entre les extracteurs du lot
+
+Fonctions :
+    register_intermediate: décorateur qui ajoute une fonction au registre INTERMEDIATES
+    register_extractor: décorateur qui ajoute une fonction au registre EXTRACTORS
+    resolve_extractors: valide une liste d'extracteurs demandés et complète leurs paramètres
+    get_schema: liste des colonnes produites par une liste d'extracteurs
+    extract_batch: calcule les caractéristiques d'un lot d'images et les écrit dans une matrice de sortie
+    extract_features: calcule la matrice de caractéristiques de toutes les images, lot par lot
+    edge_images: magnitude normalisée et gradients de Sobel d'un lot d'images, avec les intermédiaires du registre
+    count_contours, contour_lengths, contour_orientations, contour_statistics: caractéristiques de contours d'1 image
+    texture_columns: noms des colonnes de texture, 1 par propriété et par combinaison distance/angle demandée
+    texture_properties: propriétés GLCM d'un lot d'images en niveaux de gris uint8
+Ces fonctions sont l'unique définition des caractéristiques, les méthodes de ImageCollection les appellent.
+
+Extracteurs disponibles : voir EXTRACTORS, e.g. 'edges', 'texture', 'color_rgb', 'color_lab', 'color_hsv'
+"""
+
+import numpy as np
+from scipy.ndimage import label
+
+import helpers.imageprocessing as ip
+from helpers.instrumentation import PROFILER
+
+
+class FeatureExtractor:
+    """
+    Extracteur enregistré
+    function(batch, **params) reçoit un ImageBatch de N images et retourne un array (N, len(columns))
+    columns: liste des noms de colonnes, ou fonction des paramètres qui retourne cette liste
+    requires: noms des intermédiaires utilisés, ou fonction des paramètres qui retourne ces noms
+    version: version du code de l'extracteur, à incrémenter quand ses valeurs changent pour invalider la cache
+    """
+    def __init__(self, name, function, columns, defaults, requires=(), version=1):
+        self.name = name
+        self.function = function
+        self.columns = columns
+        self.defaults = defaults
+        self.requires = requires
+        self.version = version
+
+    def get_params(self, params=None):
+        """
+        Paramètres par défaut remplacés par ceux demandés, les paramètres inconnus sont refusés
+        """
+        params = dict(params or {})
+        unknown = set(params) - set(self.defaults)
+        if unknown:
+            raise ValueError(f'Paramètres inconnus pour l\'extracteur {self.name}: {sorted(unknown)}')
+        return {**self.defaults, **params}
+
+    def get_columns(self, params):
+        return list(self.columns(params) if callable(self.columns) else self.columns)
+
+    def get_requires(self, params):
+        return list(self.requires(params) if callable(self.requires) else self.requires)
+
+    def __call__(self, batch, params):
+        return self.function(batch, **params)
+
+
+# Intermédiaires : nom -> (fonction, noms des intermédiaires en entrée, étape de PROFILER),
+# 'rgb' est le lot d'images lui-même
+INTERMEDIATES = {}
+
+
+def register_intermediate(name, requires=('rgb',), stage=None):
+    """
+    Décorateur qui enregistre une fonction qui calcule un intermédiaire à partir d'autres intermédiaires
+    :param stage: nom de l'étape sous laquelle son temps est mesuré, son nom par défaut
+    """
+    def decorator(function):
+        INTERMEDIATES[name] = (function, tuple(requires), stage or name)
+        return function
+    return decorator
+
+
+# Les contours restent en float64 : en float32 le seuil de la magnitude et le signe des gradients nuls changent
+# pour quelques pixels, et donc les régions et leur orientation. Les lots étant petits, la mémoire reste bornée.
+register_intermediate('gray_f64', stage='grayscale')(lambda images: ip.rgb_to_gray(images, dtype=np.float64))
+register_intermediate('gray_u8', stage='grayscale')(ip.texture_gray)
+register_intermediate('sobel_gx', requires=('gray_f64',), stage='sobel')(
+    lambda gray: ip.sobel_gradient(gray, horizontal_edges=True))
+register_intermediate('sobel_gy', requires=('gray_f64',), stage='sobel')(
+    lambda gray: ip.sobel_gradient(gray, horizontal_edges=False))
+register_intermediate('edge_magnitude', requires=('sobel_gx', 'sobel_gy'), stage='sobel')(ip.edge_magnitude)
+register_intermediate('lab', stage='color_conversion')(ip.rgb_to_lab)
+register_intermediate('hsv', stage='color_conversion')(ip.rgb_to_hsv)
+
+
+class ImageBatch:
+    """
+    Lot d'images (N, H, W, 3) uint8 passé aux extracteurs, avec ses intermédiaires
+    Chaque intermédiaire est calculé à la première demande (get) et compte ses utilisateurs prévus (plan) :
+    les extracteurs et les intermédiaires qui en dépendent. Il est libéré quand le dernier a terminé (release).
+    """
+    def __init__(self, images, consumers=()):
+        self.images = images
+        self.values = {}
+        self.users = {}
+        for requires in consumers:
+            self.plan(requires)
+
+    def __len__(self):
+        return len(self.images)
+
+    def plan(self, names):
+        """
+        Ajoute 1 utilisateur prévu à chaque intermédiaire, et à ses entrées s'il n'était pas encore prévu
+        """
+        for name in names:
+            if name == 'rgb':
+                continue
+            if name not in INTERMEDIATES:
+                raise ValueError(f'Intermédiaire inconnu: {name}, disponibles: {sorted(INTERMEDIATES)}')
+            if not self.users.get(name) and name not in self.values:
+                self.plan(INTERMEDIATES[name][1])
+            self.users[name] = self.users.get(name, 0) + 1
+
+    def get(self, name):
+        """
+        Valeur d'un intermédiaire, calculée si nécessaire, les entrées sont libérées si plus personne n'en a besoin
+        """
+        if name == 'rgb':
+            return self.images
+        if name not in self.values:
+            if not self.users.get(name):
+                # Demande non prévue, l'intermédiaire est gardé jusqu'à la fin du lot
+                self.plan([name])
+            function, requires, stage = INTERMEDIATES[name]
+            inputs = [self.get(required) for required in requires]
+            with PROFILER.stage(stage, len(self)):
+                self.values[name] = function(*inputs)
+            del inputs
+            self.release(requires)
+        return self.values[name]
+
+    def release(self, names):
+        """
+        Retire 1 utilisateur à chaque intermédiaire, libère ceux qui n'en ont plus
+        """
+        for name in names:
+            if name == 'rgb' or name not in self.users:
+                continue
+            self.users[name] -= 1
+            if self.users[name] <= 0:
+                del self.users[name]
+                self.values.pop(name, None)
+
+
+EXTRACTORS = {}
+
+
+def register_extractor(name, columns, requires=(), version=1, **defaults):
+    """
+    Décorateur qui enregistre une fonction d'extraction dans EXTRACTORS
+    :param columns: noms des colonnes produites, ou fonction des paramètres qui les retourne
+    :param requires: noms des intermédiaires utilisés (INTERMEDIATES), ou fonction des paramètres qui les retourne
+    :param version: version du code de l'extracteur, fait partie de la clé de la cache de caractéristiques
+    :param defaults: paramètres acceptés par la fonction et leur valeur par défaut
+    """
+    def decorator(function):
+        EXTRACTORS[name] = FeatureExtractor(name, function, columns, defaults, requires, version)
+        return function
+    return decorator
+
+
+def resolve_extractors(extractors):
+    """
+    Transforme une liste de noms ou de tuples (nom, paramètres) en liste de (FeatureExtractor, paramètres complets)
+    """
+    resolved = []
+    for extractor in extractors:
+        name, params = (extractor, None) if isinstance(extractor, str) else extractor
+        if name not in EXTRACTORS:
+            raise ValueError(f'Extracteur inconnu: {name}, disponibles: {sorted(EXTRACTORS)}')
+        resolved.append((EXTRACTORS[name], EXTRACTORS[name].get_params(params)))
+    return resolved
+
+
+def get_schema(extractors):
+    """
+    Retourne la liste ordonnée des colonnes produites par les extracteurs, les doublons sont refusés
+    """
+    columns = []
+    for extractor, params in resolve_extractors(extractors):
+        columns.extend(extractor.get_columns(params))
+    duplicates = sorted({column for column in columns if columns.count(column) > 1})
+    if duplicates:
+        raise ValueError(f'Colonnes produites par plus d\'un extracteur: {duplicates}')
+    return columns
+
+
+def extract_batch(images, extractors, out):
+    """
+    Calcule les caractéristiques d'un lot d'images et les écrit dans out (len(images), n_colonnes)
+    Les intermédiaires sont calculés 1 seule fois pour tous les extracteurs et libérés après leur dernier utilisateur
+    """
+    resolved = resolve_extractors(extractors)
+    batch = ImageBatch(images, [extractor.get_requires(params) for extractor, params in resolved])
+    column = 0
+    for extractor, params in resolved:
+        n_columns = len(extractor.get_columns(params))
+        out[:, column:column + n_columns] = extractor(batch, params)
+        batch.release(extractor.get_requires(params))
+        column += n_columns
+    return out
+
+
+def extract_features(images, extractors, batch_size=64):
+    """
+    Calcule la matrice (n_images, n_colonnes) des caractéristiques de toutes les images, lot par lot
+    :return: la matrice float64 et la liste des colonnes
+    """
+    columns = get_schema(extractors)
+    features = np.empty((len(images), len(columns)))
+    for start in range(0, len(images), batch_size):
+        extract_batch(images[start:start + batch_size], extractors, features[start:start + batch_size])
+    return features, columns
+
+
+###############################################
+# Extracteurs
+
+def edge_images(images):
+    """
+    Magnitude normalisée entre 0 et 255, gradient_x (sobel_h) et gradient_y (sobel_v) d'un lot d'images RGB,
+    les mêmes intermédiaires que l'extracteur 'edges'
+    :return: 3 arrays (N, H, W) float64, identiques à l'ancien ImageCollection.get_edge_detection
+    """
+    batch = ImageBatch(images, [('edge_magnitude', 'sobel_gx', 'sobel_gy')])
+    return batch.get('edge_magnitude'), batch.get('sobel_gx'), batch.get('sobel_gy')
+
+
+def count_contours(edge_image, threshold):
+    """
+    Régions connexes d'1 image de contours seuillée
+    :return: l'image étiquetée et le nombre de régions
+    """
+    with PROFILER.stage('labelling', 1):
+        return label(edge_image > threshold)
+
+
+def contour_lengths(labeled_array, num_features):
+    """
+    Longueur (nombre de pixels) des régions, en 1 passe sur l'image étiquetée
+    :return: longueur moyenne, totale et écart-type
+    """
+    lengths = ip.label_sizes(labeled_array, num_features).astype(float)
+    return np.mean(lengths), np.sum(lengths), np.std(lengths)
+
+
+def contour_orientations(gradient_x, gradient_y, labeled_array, num_features):
+    """
+    Orientation moyenne (arctan2) du gradient de chaque région, en 1 passe sur l'image étiquetée, même arrondi que
+    np.mean sur le masque de chaque région (ip.label_means)
+    :return: moyenne et écart-type des orientations des régions, en degrés
+    """
+    orientations = np.rad2deg(ip.label_means(np.arctan2(gradient_y, gradient_x), labeled_array, num_features))
+    return np.mean(orientations), np.std(orientations)
+
+
+def contour_statistics(edge_image, gradient_x, gradient_y, threshold):
+    """
+    Statistiques des contours connexes d'1 image de contours
+    :return: nombre, longueur moyenne, totale et écart-type, orientation moyenne et écart-type (degrés)
+    """
+    labeled_array, num_features = count_contours(edge_image, threshold)
+    with PROFILER.stage('contour_stats', 1):
+        return ((num_features,) + contour_lengths(labeled_array, num_features)
+                + contour_orientations(gradient_x, gradient_y, labeled_array, num_features))
+
+
+@register_extractor('edges', columns=['num_features', 'mean_lengths', 'total_length', 'total_std_length',
+                                      'mean_orientation', 'std_orientation'],
+                    requires=('edge_magnitude', 'sobel_gx', 'sobel_gy'), version=3, threshold=50)
+def edge_features(batch, threshold):
+    """
+    Contours de Sobel seuillés, threshold s'applique à la magnitude normalisée entre 0 et 255
+    Version 3: gradients float64 par lot, valeurs identiques bit à bit à l'ancien get_edge_detection et
+    contour_orientations (les versions 1 et 2, en float32, changeaient l'orientation jusqu'à ~1.5°)
+    """
+    return np.array([contour_statistics(magnitude, gradient_x, gradient_y, threshold)
+                     for magnitude, gradient_x, gradient_y in zip(batch.get('edge_magnitude'), batch.get('sobel_gx'),
+                                                                  batch.get('sobel_gy'))])
+
+
+def texture_columns(distances=(1,), angles=(0,), average_angles=False):
+    """
+    Noms des colonnes de texture, par propriété puis par distance puis par angle (radians, nommés en degrés)
+    Avec 1 seule combinaison, les noms sont ceux de ip.GLCM_PROPERTIES, sinon '<propriété>_d<distance>_a<angle>',
+    ou '<propriété>_d<distance>' si average_angles
+    """
+    angles = [None] if average_angles else angles
+    if len(distances) * len(angles) == 1:
+        return list(ip.GLCM_PROPERTIES)
+    return [f'{prop}_d{distance:g}' + ('' if angle is None else f'_a{np.rad2deg(angle):.0f}')
+            for prop in ip.GLCM_PROPERTIES for distance in distances for angle in angles]
+
+
+@register_extractor('texture', version=2,
+                    columns=lambda params: texture_columns(params['distances'], params['angles'],
+                                                           params['average_angles']),
+                    requires=('gray_u8',), distances=(1,), angles=(0,), levels=256, average_angles=False)
+def texture_features(batch, distances, angles, levels, average_angles):
+    """
+    Propriétés GLCM pour chaque distance et chaque angle demandés, ou la moyenne sur les angles, voir texture_columns
+    Version 2: 1 colonne par combinaison distance/angle, la version 1 ne gardait que la première
+    """
+    return texture_properties(batch.get('gray_u8'), distances, angles, levels, average_angles)
+
+
+def texture_properties(gray, distances=(1,), angles=(0,), levels=256, average_angles=False):
+    """
+    Propriétés GLCM (ip.GLCM_PROPERTIES) d'un lot d'images en niveaux de gris uint8 (N, H, W), seulement pour les
+    distances et angles demandés
+    :param levels: nombre de niveaux de gris des GLCM, e.g. 16, 32 ou 64 pour des matrices plus petites
+    :param average_angles: moyenne sur les angles (invariant en rotation) plutôt que 1 valeur par angle
+    :return: array (N, n_colonnes), colonnes dans l'ordre de texture_columns
+    """
+    with PROFILER.stage('glcm', len(gray)):
+        glcm = ip.batch_glcm(ip.quantize_gray(gray, levels), distances=distances, angles=angles,
+                             levels=levels, symmetric=True, normed=True)
+        properties = ip.glcm_properties(glcm, average_angles=average_angles)
+    return np.concatenate([values.reshape(len(values), -1) for values in properties.values()], axis=1)
+
+
+COLOR_CHANNELS = {'RGB': ('red', 'green', 'blue'), 'Lab': ('L', 'a', 'b'), 'HSV': ('hue', 'saturation', 'value')}
+COLOR_PLANES = {'RGB': 'rgb', 'Lab': 'lab', 'HSV': 'hsv'}
+
+
+def color_statistics(percentiles):
+    return ['mean', 'median', 'variance'] + [f'percentile{percentile:g}' for percentile in percentiles]
+
+
+def color_columns(color_space, percentiles=(25, 75)):
+    return [f'{statistic}_{channel}' for statistic in color_statistics(percentiles)
+            for channel in COLOR_CHANNELS[color_space]]
+
+
+def color_features(batch, color_space, percentiles):
+    """
+    Moyenne, médiane, variance et percentiles demandés de chaque canal dans l'espace de couleur demandé
+    En RGB, les statistiques viennent d'1 histogramme par canal et les percentiles sont exacts
+    """
+    planes = batch.get(COLOR_PLANES[color_space])
+    with PROFILER.stage('color_stats', len(batch)):
+        statistics = ip.batch_color_statistics(planes, percentiles)
+    return np.concatenate([statistics[name] for name in color_statistics(percentiles)], axis=1)
+
+
+for _color_space in COLOR_CHANNELS:
+    register_extractor(f'color_{_color_space.lower()}', version=3,
+                       columns=lambda params: color_columns(params['color_space'], params['percentiles']),
+                       requires=lambda params: [COLOR_PLANES[params['color_space']]],
+                       color_space=_color_space, percentiles=(25, 75))(color_features)
@@ -0,0 +1,251 @@
+"""
+Stockage binaire en colonnes des caractéristiques de la problématique
+APP2 S8 GIA
+Un dossier de caractéristiques contient :
+    features.npy: la matrice (n_images, n_colonnes) float64 en ordre Fortran, chaque colonne est contiguë sur le disque
+    labels.npy: l'étiquette de chaque ligne
+    filenames.npy: le nom du fichier de l'image de chaque ligne
+    schema.json: les noms des colonnes, le nom des étiquettes et les colonnes utilisées par défaut, écrit en dernier
+La matrice est lue en memmap : lire quelques colonnes ne lit que les pages de ces colonnes.
+
+Classe :
+    FeatureStore: lecture d'un dossier de caractéristiques, par colonnes nommées
+
+Fonctions :
+    write_feature_store: écrit un dossier de caractéristiques
+    join_feature_stores: joint les colonnes de plusieurs dossiers de caractéristiques par image, colonne par colonne
+    convert_text_folder: convertit un ancien dossier de fichiers .txt (1 par classe) en dossier de caractéristiques
+    is_feature_store: indique si un dossier contient un stockage de caractéristiques
+"""
+
+import json
+import os
+
+import numpy as np
+
+SCHEMA_FILE = 'schema.json'
+FORMAT_VERSION = 1
+
+
+def is_feature_store(folder):
+    return os.path.exists(os.path.join(folder, SCHEMA_FILE))
+
+
+def write_feature_store(folder, features, columns, labels, filenames, label_names=None, default_columns=None):
+    """
+    Écrit un dossier de caractéristiques, le schéma est écrit en dernier pour ne jamais laisser un dossier incomplet
+    :param features: matrice (n_images, n_colonnes)
+    :param columns: nom de chaque colonne
+    :param labels: étiquette (entier) de chaque ligne
+    :param filenames: nom du fichier de l'image de chaque ligne
+    :param label_names: dictionnaire étiquette -> nom de la classe
+    :param default_columns: colonnes lues quand aucune n'est demandée, toutes par défaut
+    """
+    features = np.asfortranarray(features, dtype=np.float64)
+    columns, labels, filenames = list(columns), np.asarray(labels, dtype=np.int64), np.asarray(filenames, dtype=str)
+    if features.shape != (len(labels), len(columns)) or len(filenames) != len(labels):
+        raise ValueError(f'Dimensions incohérentes: features {features.shape}, {len(columns)} colonnes, '
+                         f'{len(labels)} étiquettes, {len(filenames)} noms de fichiers')
+    unknown = [column for column in default_columns or [] if column not in columns]
+    if unknown:
+        raise ValueError(f'Colonnes par défaut inconnues: {unknown}')
+
+    _remove_schema(folder)
+    np.save(os.path.join(folder, 'features.npy'), features)
+    _write_store(folder, columns, labels, filenames, label_names, default_columns)
+
+
+def _remove_schema(folder):
+    """
+    Le dossier n'est plus un stockage valide tant que le nouveau schéma n'est pas écrit
+    """
+    os.makedirs(folder, exist_ok=True)
+    schema_file = os.path.join(folder, SCHEMA_FILE)
+    if os.path.exists(schema_file):
+        os.remove(schema_file)
+
+
+def _write_store(folder, columns, labels, filenames, label_names, default_columns):
+    """
+    Écrit les étiquettes, les noms de fichiers et le schéma d'un dossier dont features.npy est déjà écrit
+    """
+    np.save(os.path.join(folder, 'labels.npy'), labels)
+    np.save(os.path.join(folder, 'filenames.npy'), filenames)
+    schema = {'format_version': FORMAT_VERSION,
+              'n_rows': len(labels),
+              'columns': columns,
+              'default_columns': list(default_columns or columns),
+              'label_names': {str(label): name for label, name in (label_names or {}).items()}}
+    with open(os.path.join(folder, SCHEMA_FILE), 'w') as file:
+        json.dump(schema, file, indent=1)
+
+
+def join_feature_stores(folders, destination, columns=None, how='exact', default_columns=None):
+    """
+    Joint les colonnes de plusieurs dossiers de caractéristiques en alignant les lignes par nom de fichier d'image
+    Les colonnes sont copiées une à une depuis les memmap des sources vers le memmap de destination,
+    la mémoire utilisée ne dépend pas du nombre de colonnes.
+    :param folders: dossiers des stockages à joindre, dans l'ordre des colonnes du résultat
+    :param destination: dossier du stockage joint
+    :param columns: pour chaque source, la liste des colonnes à garder ou None pour toutes
+    :param how: 'exact' refuse des sources qui n'ont pas exactement les mêmes images,
+                'inner' garde seulement les images présentes dans toutes les sources
+    :param default_columns: colonnes lues par défaut dans le résultat, toutes par défaut
+    :return: le FeatureStore joint
+    """
+    if how not in ('exact', 'inner'):
+        raise ValueError(f'how doit être \'exact\' ou \'inner\', pas {how}')
+    stores = [FeatureStore(folder) for folder in folders]
+    columns = [None] * len(stores) if columns is None else list(columns)
+    if len(columns) != len(stores):
+        raise ValueError(f'{len(columns)} listes de colonnes pour {len(stores)} sources')
+    if os.path.abspath(destination) in [os.path.abspath(folder) for folder in folders]:
+        raise ValueError('Le dossier de destination ne peut pas être une des sources')
+
+    #Images communes, dans l'ordre de la première source
+    for store in stores:
+        if len(np.unique(store.filenames)) != len(store):
+            raise ValueError(f'{store.folder}: plusieurs lignes pour la même image')
+    filenames = stores[0].filenames
+    for store in stores[1:]:
+        if how == 'exact' and (len(store) != len(stores[0]) or not np.isin(filenames, store.filenames).all()):
+            raise ValueError(f'{store.folder} a {len(store)} lignes et {stores[0].folder} en a {len(stores[0])}, '
+                             f'{np.count_nonzero(~np.isin(filenames, store.filenames))} images de la première '
+                             f'source sont absentes')
+        filenames = filenames[np.isin(filenames, store.filenames)]
+
+    #Position des images communes dans chaque source, et vérification des étiquettes
+    rows = []
+    for store in stores:
+        order = np.argsort(store.filenames)
+        rows.append(order[np.searchsorted(store.filenames, filenames, sorter=order)])
+    labels = stores[0].labels[rows[0]]
+    for store, store_rows in zip(stores[1:], rows[1:]):
+        different = store.labels[store_rows] != labels
+        if different.any():
+            raise ValueError(f'{store.folder}: étiquettes différentes pour {np.count_nonzero(different)} images, '
+                             f'e.g. {filenames[different][:5].tolist()}')
+
+    selected = [(store, store_rows, store.get_indexes(store.columns if store_columns is None else store_columns))
+                for store, store_rows, store_columns in zip(stores, rows, columns)]
+    joined_columns = [store.columns[index] for store, _, indexes in selected for index in indexes]
+    duplicates = sorted({column for column in joined_columns if joined_columns.count(column) > 1})
+    if duplicates:
+        raise ValueError(f'Colonnes présentes dans plus d\'une source: {duplicates}')
+    unknown = [column for column in default_columns or [] if column not in joined_columns]
+    if unknown:
+        raise ValueError(f'Colonnes par défaut inconnues: {unknown}')
+
+    _remove_schema(destination)
+    features = np.lib.format.open_memmap(os.path.join(destination, 'features.npy'), mode='w+', dtype=np.float64,
+                                         shape=(len(filenames), len(joined_columns)), fortran_order=True)
+    column = 0
+    for store, store_rows, indexes in selected:
+        identity = len(store_rows) == len(store) and np.array_equal(store_rows, np.arange(len(store)))
+        for index in indexes:
+            features[:, column] = store.features[:, index] if identity else store.features[:, index][store_rows]
+            column += 1
+    features.flush()
+    del features
+    label_names = {label: name for store in stores for label, name in store.label_names.items()}
+    _write_store(destination, joined_columns, labels, filenames, label_names, default_columns)
+    return FeatureStore(destination)
+
+
+def convert_text_folder(folder, destination, class_files=('coast.txt', 'forest.txt', 'street.txt'), columns=None,
+                        default_columns=None):
+    """
+    Convertit un ancien dossier de la problématique, 1 fichier .txt par classe sans nom de colonne ni d'image,
+    en dossier de caractéristiques lisible par FeatureStore et join_feature_stores
+    Les fichiers ne contiennent pas le nom des images : la ligne i de la classe c est nommée '<c>_<i>'.
+    Deux dossiers convertis ne se joignent donc correctement que s'ils viennent d'extractions sur les mêmes images
+    dans le même ordre (ce que supposait l'ancienne concaténation ligne à ligne), et jamais avec un dossier écrit
+    par ImageCollection.get_feature_extraction.
+    :param class_files: fichier de chaque classe, dans l'ordre des étiquettes 1, 2, 3 de ImageCollection.imageLabels
+    :param columns: nom des colonnes, '<nom du dossier>_<j>' par défaut pour ne pas entrer en conflit à la jointure
+    :return: le FeatureStore converti
+    """
+    data, labels, filenames, label_names = [], [], [], {}
+    for label, class_file in enumerate(class_files, 1):
+        name = os.path.splitext(class_file)[0]
+        rows = np.loadtxt(os.path.join(folder, class_file), ndmin=2)
+        data.append(rows)
+        labels.append(np.full(len(rows), label))
+        filenames.extend(f'{name}_{i}' for i in range(len(rows)))
+        label_names[label] = name
+    features = np.vstack(data)
+    if features.size == 0:
+        raise ValueError(f'Aucune donnée dans {folder}')
+    if columns is None:
+        prefix = os.path.basename(os.path.normpath(folder))
+        columns = [f'{prefix}_{j}' for j in range(features.shape[1])]
+    write_feature_store(destination, features, columns, np.concatenate(labels), filenames, label_names,
+                        default_columns)
+    return FeatureStore(destination)
+
+
+class FeatureStore:
+    """
+    Lecture d'un dossier de caractéristiques
+    columns: noms des colonnes
+    labels, filenames: étiquette et nom de fichier de chaque ligne
+    features: la matrice complète en memmap, rien n'est lu avant d'y accéder
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        with open(os.path.join(folder, SCHEMA_FILE)) as file:
+            self.schema = json.load(file)
+        if self.schema['format_version'] != FORMAT_VERSION:
+            raise ValueError(f'Version de format non supportée: {self.schema["format_version"]}')
+        self.columns = self.schema['columns']
+        self.default_columns = self.schema['default_columns']
+        self.label_names = {int(label): name for label, name in self.schema['label_names'].items()}
+        self.features = np.load(os.path.join(folder, 'features.npy'), mmap_mode='r')
+        self.labels = np.load(os.path.join(folder, 'labels.npy'))
+        self.filenames = np.load(os.path.join(folder, 'filenames.npy'))
+
+    def __len__(self):
+        return self.schema['n_rows']
+
+    def get_indexes(self, columns=None):
+        """
+        Position des colonnes demandées, les colonnes par défaut si columns est None
+        """
+        columns = self.default_columns if columns is None else list(columns)
+        unknown = [column for column in columns if column not in self.columns]
+        if unknown:
+            raise ValueError(f'Colonnes inconnues {unknown}, disponibles: {self.columns}')
+        return [self.columns.index(column) for column in columns]
+
+    def column(self, name):
+        """
+        Vue memmap d'une colonne, sans copie
+        """
+        return self.features[:, self.get_indexes([name])[0]]
+
+    def read(self, columns=None, rows=None):
+        """
+        Lit les colonnes demandées, seulement les pages de ces colonnes sont lues
+        :param rows: masque ou indices des lignes à garder, toutes par défaut
+        :return: array (n_lignes, n_colonnes demandées)
+        """
+        selected = [self.features[:, index] for index in self.get_indexes(columns)]
+        data = np.stack(selected, axis=1) if selected else np.empty((len(self), 0))
+        return data if rows is None else data[rows]
+
+    def iter_chunks(self, columns=None, chunk_size=4096):
+        """
+        Lit les colonnes demandées par tranches de chunk_size lignes, pour traiter un stockage plus grand que la mémoire
+        :return: générateur de (étiquettes, array (n_lignes de la tranche, n_colonnes demandées))
+        """
+        indexes = self.get_indexes(columns)
+        for start in range(0, len(self), chunk_size):
+            rows = slice(start, start + chunk_size)
+            yield self.labels[rows], np.stack([self.features[rows, index] for index in indexes], axis=1)
+
+    def class_lists(self, columns=None):
+        """
+        Les lignes de chaque classe, dans l'ordre croissant des étiquettes, au format dataLists de ClassificationData
+        """
+        data = self.read(columns)
+        return [data[self.labels == label] for label in np.unique(self.labels)]
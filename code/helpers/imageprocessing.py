@@ -0,0 +1,504 @@
+"""
+Fonctions de traitement d'images vectorisées pour l'extraction des caractéristiques
+APP2 S8 GIA
+Toutes les fonctions acceptent 1 image ou un lot d'images empilées selon la première dimension
+
+Fonctions :
+    batch_histograms: histogramme de chaque canal d'une image (H, W, C) ou d'un lot (N, H, W, C), bincount décalé
+        par image et par canal
+    batch_color_statistics: moyenne, variance, médiane et percentiles de chaque canal, en 1 histogramme (uint8)
+        ou 1 tri par canal (autres types)
+    label_sizes: nombre de pixels de chaque région d'une image étiquetée, en 1 seule passe
+    label_means: moyenne d'une quantité par pixel sur chaque région d'une image étiquetée, en 1 seule passe,
+        même arrondi que np.mean
+    pairwise_sums: somme de plusieurs segments d'un array, même arrondi que np.sum (sommation par paires de numpy)
+
+    rgb_to_gray: conversion en niveaux de gris d'un lot d'images RGB, en float32 ou float64
+    rgb_to_lab: conversion Lab d'un lot d'images RGB en float32, linéarisation sRGB par table de 256 valeurs pour uint8
+    rgb_to_hsv: conversion HSV d'un lot d'images RGB en float32
+    sobel_gradient: 1 gradient de Sobel, horizontal ou vertical, d'un lot d'images en niveaux de gris, identique à
+        skimage.filters.sobel_h / sobel_v
+    sobel_gradients: gradients de Sobel horizontaux et verticaux d'un lot d'images en niveaux de gris
+    edge_magnitude: magnitude des gradients normalisée entre 0 et 255 pour chaque image
+
+    separable_kernel: décompose un noyau 2D de rang 1 en 2 noyaux 1D
+    convolve2d: convolution 2D avec padding de zéros d'1 image (H, W) ou d'un lot (N, H, W), choisit automatiquement
+        entre le chemin séparable, direct ou par FFT
+
+    texture_gray: niveaux de gris uint8 utilisés pour la texture (même conversion que skimage.color.rgb2gray * 255)
+    quantize_gray: réduit des niveaux de gris uint8 à levels niveaux
+    batch_glcm: matrices de co-occurrence (GLCM) d'un lot d'images, seulement pour les distances et angles demandés
+    glcm_properties: propriétés de texture de graycoprops calculées sur un lot de GLCM, moyenne sur les angles optionnelle
+"""
+
+import numpy as np
+from scipy import ndimage as ndi
+from scipy.signal import fftconvolve
+
+
+# Poids de la conversion RGB -> gris utilisée pour la détection de contours
+GRAY_WEIGHTS = (0.2989, 0.5870, 0.1140)
+# Noyau de Sobel, identique à skimage.filters.sobel_h / sobel_v (dérivée [1, 0, -1], lissage [1, 2, 1] / 4)
+SOBEL_EDGE = (1., 0., -1.)
+SOBEL_SMOOTH = (0.25, 0.5, 0.25)
+# Taille des blocs de la sommation par paires de numpy (PW_BLOCKSIZE), sommés avec 8 accumulateurs
+PAIRWISE_BLOCK = 128
+# Au-delà de ce nombre de coefficients, un noyau non séparable est appliqué par FFT
+FFT_KERNEL_SIZE = 15 * 15
+# Matrice RGB linéaire -> XYZ et blanc de référence D65 (observateur 2°), mêmes valeurs que skimage.color
+XYZ_FROM_RGB = ((0.412453, 0.357580, 0.180423),
+                (0.212671, 0.715160, 0.072169),
+                (0.019334, 0.119193, 0.950227))
+D65_WHITE = (0.95047, 1., 1.08883)
+# Poids de skimage.color.rgb2gray, utilisés pour la texture
+TEXTURE_GRAY_WEIGHTS = (0.2125, 0.7154, 0.0721)
+# Propriétés de texture disponibles, mêmes définitions que skimage.feature.graycoprops
+GLCM_PROPERTIES = ('contrast', 'dissimilarity', 'homogeneity', 'energy', 'correlation', 'ASM')
+
+
+def _histogram_bins(values, n_bins, value_range):
+    """
+    Retourne l'index de bin de chaque valeur, n_bins pour les valeurs qui ne tombent dans aucune bin
+    """
+    if value_range is not None:
+        low, high = value_range
+        bins = np.floor((values - low) * (n_bins / (high - low)))
+        bins[values == high] = n_bins - 1  # la borne supérieure fait partie de la dernière bin
+    elif values.dtype == np.uint8 and n_bins >= 256:
+        return values
+    else:
+        bins = values
+    valid = (bins >= 0) & (bins < n_bins)
+    if not np.issubdtype(bins.dtype, np.integer):
+        valid &= bins == np.floor(bins)
+        return np.where(valid, bins, n_bins).astype(np.intp)
+    return np.where(valid, bins, n_bins)
+
+
+def batch_histograms(images, n_bins=256, value_range=None, block_values=2**20):
+    """
+    Calcule l'histogramme de chaque canal de toutes les images en 1 seul bincount décalé par image et par canal
+    :param images: 1 image (H, W, C) ou un lot (N, H, W, C)
+    :param n_bins: nombre de bins par canal
+    :param value_range: (min, max) pour quantifier des valeurs arbitraires en n_bins bins. Si absent, les valeurs
+        sont utilisées directement comme index de bin (e.g. uint8 ou sortie de analysis.rescaleHistLab), les valeurs
+        non entières ou hors de [0, n_bins[ sont ignorées
+    :param block_values: nombre maximal de valeurs par bincount, les index (intp, 8 octets par valeur) d'un grand lot
+        sont comptés par blocs d'images pour rester en cache plutôt que matérialisés pour tout le lot
+    :return: les comptes, avec la forme (C, n_bins) pour 1 image ou (N, C, n_bins) pour un lot
+    """
+    images = np.asarray(images)
+    single = images.ndim == 3
+    if single:
+        images = images[np.newaxis]
+    n_images, n_channels = images.shape[0], images.shape[-1]
+    values = images.reshape(n_images, int(np.prod(images.shape[1:])))
+
+    # Chaque (image, canal) a sa plage de n_bins + 1 index, la dernière sert de poubelle pour les valeurs ignorées.
+    # Les décalages sont précalculés dans l'ordre des valeurs (pixels entrelacés), 1 seule addition par valeur.
+    stride = n_bins + 1
+    block = max(1, min(n_images, block_values // max(values.shape[1], 1)))
+    offsets = (np.arange(block)[:, np.newaxis] * (n_channels * stride)
+               + np.tile(np.arange(n_channels) * stride, values.shape[1] // n_channels)).astype(np.intp)
+    index = np.empty_like(offsets)
+
+    histograms = np.empty((n_images, n_channels, n_bins), dtype=np.int64)
+    for start in range(0, n_images, block):
+        chunk = values[start:start + block]
+        n = len(chunk)
+        np.add(_histogram_bins(chunk, n_bins, value_range), offsets[:n], out=index[:n])
+        counts = np.bincount(index[:n].ravel(), minlength=n * n_channels * stride)
+        histograms[start:start + n] = counts.reshape(n, n_channels, stride)[:, :, :n_bins]
+
+    return histograms[0] if single else histograms
+
+
+def _order_statistics(counts, percentiles):
+    """
+    Percentiles exacts à partir des histogrammes d'entiers 0..n_bins-1, même interpolation linéaire que np.percentile
+    :param counts: histogrammes (..., n_bins)
+    :return: array (..., len(percentiles))
+    """
+    cumulative = np.cumsum(counts, axis=-1)
+    n_values = cumulative[..., -1:]
+    position = np.asarray(percentiles, dtype=float) / 100 * (n_values - 1)
+    lower = np.floor(position)
+    # Valeur de rang k: premier bin dont le compte cumulé dépasse k
+    lower_value = (cumulative[..., np.newaxis, :] <= lower[..., np.newaxis]).sum(axis=-1)
+    upper_value = (cumulative[..., np.newaxis, :] <= lower[..., np.newaxis] + 1).sum(axis=-1)
+    upper_value = np.minimum(upper_value, counts.shape[-1] - 1)
+    return lower_value + (position - lower) * (upper_value - lower_value)
+
+
+def batch_color_statistics(images, percentiles=(25, 75)):
+    """
+    Moyenne, variance, médiane et percentiles de chaque canal, en 1 seule passe sur les pixels
+    Les images uint8 passent par 1 histogramme de 256 bins par canal, les percentiles sont exacts.
+    Les autres types (e.g. Lab, HSV en float) sont triés 1 fois par canal.
+    :param images: 1 image (H, W, C) ou un lot (N, H, W, C)
+    :param percentiles: percentiles à calculer en plus de la médiane, entre 0 et 100
+    :return: dictionnaire 'mean', 'variance', 'median', puis 'percentile<p>' pour chaque p, avec des valeurs de forme
+        (C,) pour 1 image ou (N, C) pour un lot
+    """
+    images = np.asarray(images)
+    single = images.ndim == 3
+    if single:
+        images = images[np.newaxis]
+    quantiles = (50,) + tuple(percentiles)
+
+    if images.dtype == np.uint8:
+        counts = batch_histograms(images)
+        levels = np.arange(256, dtype=float)
+        n_values = counts.sum(axis=-1)
+        mean = counts @ levels / n_values
+        variance = (counts * (levels - mean[..., np.newaxis]) ** 2).sum(axis=-1) / n_values
+        order = _order_statistics(counts, quantiles)
+    else:
+        values = images.reshape(images.shape[0], -1, images.shape[-1]).astype(float)
+        mean = values.mean(axis=1)
+        variance = values.var(axis=1)
+        values.sort(axis=1)
+        position = np.asarray(quantiles, dtype=float) / 100 * (values.shape[1] - 1)
+        lower = np.floor(position).astype(int)
+        upper = np.minimum(lower + 1, values.shape[1] - 1)
+        fraction = (position - lower)[:, np.newaxis]
+        order = values[:, lower] + fraction * (values[:, upper] - values[:, lower])
+        order = np.moveaxis(order, 1, -1)
+
+    statistics = {'mean': mean, 'variance': variance, 'median': order[..., 0]}
+    for i, percentile in enumerate(percentiles, 1):
+        statistics[f'percentile{percentile:g}'] = order[..., i]
+    if single:
+        statistics = {name: value[0] for name, value in statistics.items()}
+    return statistics
+
+
+def label_sizes(labeled_array, num_features):
+    """
+    Compte les pixels de chaque région étiquetée (e.g. sortie de scipy.ndimage.label)
+    :param labeled_array: image d'étiquettes, 0 pour le fond et 1 à num_features pour les régions
+    :param num_features: nombre de régions
+    :return: array de num_features comptes, la région i est à l'index i - 1
+    """
+    return np.bincount(labeled_array.ravel(), minlength=num_features + 1)[1:num_features + 1]
+
+
+def label_means(values, labeled_array, num_features):
+    """
+    Calcule la moyenne de values sur chaque région étiquetée, en 1 seule passe sur l'image peu importe le nombre de régions
+    Identique bit à bit à np.mean(values[labeled_array == i]) : les pixels sont regroupés par région dans l'ordre de
+    l'image (tri stable) et chaque région est sommée par paires comme numpy (pairwise_sums)
+    :param values: quantité par pixel, même forme que labeled_array
+    :return: array de num_features moyennes, la région i est à l'index i - 1
+    """
+    labels = labeled_array.ravel()
+    pixels = np.flatnonzero(labels)
+    pixels = pixels[np.argsort(labels[pixels], kind='stable')]
+    sizes = label_sizes(labeled_array, num_features)
+    return pairwise_sums(values.ravel()[pixels], np.cumsum(sizes) - sizes, sizes) / sizes
+
+
+def pairwise_sums(values, starts, lengths):
+    """
+    Somme de chaque segment values[start:start + length], vectorisée sur tous les segments
+    Reproduit la sommation par paires de np.add.reduce (pairwise_sum de numpy) : moins de 8 valeurs sommées dans
+    l'ordre, jusqu'à PAIRWISE_BLOCK valeurs sommées avec 8 accumulateurs, au-delà le segment est coupé en 2.
+    Le résultat est donc identique bit à bit à np.sum(values[start:start + length]).
+    :param values: array 1D
+    :param starts, lengths: début et longueur de chaque segment
+    :return: array des sommes, même type que values
+    """
+    return 0 + _pairwise_sums(values, np.asarray(starts, dtype=np.intp), np.asarray(lengths, dtype=np.intp))
+
+
+def _pairwise_sums(values, starts, lengths):
+    sums = np.zeros(len(starts), dtype=values.dtype)
+    # Moins de 8 valeurs : somme dans l'ordre à partir de 0
+    small = lengths < 8
+    for k in range(7):
+        rows = np.flatnonzero(small & (lengths > k))
+        sums[rows] += values[starts[rows] + k]
+    # Jusqu'à PAIRWISE_BLOCK valeurs : 8 accumulateurs, combinés par paires, puis le reste dans l'ordre
+    rows = np.flatnonzero((lengths >= 8) & (lengths <= PAIRWISE_BLOCK))
+    if rows.size:
+        start, length = starts[rows], lengths[rows]
+        end = length - length % 8
+        lanes = np.arange(8)
+        partial = values[start[:, np.newaxis] + lanes]
+        for i in range(8, PAIRWISE_BLOCK, 8):
+            more = np.flatnonzero(end > i)
+            partial[more] += values[start[more, np.newaxis] + i + lanes]
+        total = (((partial[:, 0] + partial[:, 1]) + (partial[:, 2] + partial[:, 3]))
+                 + ((partial[:, 4] + partial[:, 5]) + (partial[:, 6] + partial[:, 7])))
+        for k in range(7):
+            more = np.flatnonzero(end + k < length)
+            total[more] += values[start[more] + end[more] + k]
+        sums[rows] = total
+    # Plus de PAIRWISE_BLOCK valeurs : 2 moitiés, la première arrondie à un multiple de 8
+    rows = np.flatnonzero(lengths > PAIRWISE_BLOCK)
+    if rows.size:
+        start, length = starts[rows], lengths[rows]
+        half = length // 2
+        half -= half % 8
+        halves = _pairwise_sums(values, np.concatenate([start, start + half]), np.concatenate([half, length - half]))
+        sums[rows] = halves[:rows.size] + halves[rows.size:]
+    return sums
+
+
+def rgb_to_gray(images, weights=GRAY_WEIGHTS, dtype=np.float32):
+    """
+    Convertit 1 image (H, W, 3) ou un lot (N, H, W, 3) en niveaux de gris, directement dans le type demandé
+    Calculé R * w_r + G * w_g + B * w_b dans cet ordre, en float64 identique à ImageCollection.rgb_to_grayscale
+    """
+    images = np.asarray(images)
+    red, green, blue = (dtype(weight) for weight in weights)
+    return red * images[..., 0] + green * images[..., 1] + blue * images[..., 2]
+
+
+def _srgb_to_linear(values):
+    return np.where(values > 0.04045, ((values + 0.055) / 1.055) ** 2.4, values / 12.92)
+
+
+# Valeur linéaire de chaque niveau sRGB uint8, calculée 1 seule fois
+SRGB_LINEAR_LUT = _srgb_to_linear(np.arange(256) / 255.).astype(np.float32)
+
+
+def _rgb_float(images, dtype):
+    """
+    Images RGB en float entre 0 et 1, les uint8 sont divisés par 255 comme skimage.util.img_as_float
+    """
+    images = np.asarray(images)
+    if images.dtype == np.uint8:
+        return images.astype(dtype) * dtype(1 / 255.)
+    return images.astype(dtype, copy=False)
+
+
+def rgb_to_lab(images, dtype=np.float32):
+    """
+    Conversion RGB -> Lab (D65, 2°) d'1 image ou d'un lot, mêmes formules que skimage.color.rgb2lab
+    Les images uint8 sont linéarisées par SRGB_LINEAR_LUT au lieu d'une puissance 2.4 par pixel
+    """
+    images = np.asarray(images)
+    if images.dtype == np.uint8:
+        linear = SRGB_LINEAR_LUT.astype(dtype, copy=False)[images]
+    else:
+        linear = _srgb_to_linear(_rgb_float(images, dtype)).astype(dtype, copy=False)
+    # XYZ normalisé par le blanc de référence, en 1 seul produit matriciel
+    matrix = (np.asarray(XYZ_FROM_RGB) / np.asarray(D65_WHITE)[:, np.newaxis]).T.astype(dtype)
+    xyz = linear @ matrix
+    del linear
+    small = xyz <= 0.008856
+    xyz = np.where(small, dtype(7.787) * xyz + dtype(16. / 116.), np.cbrt(xyz))
+    lab = np.empty_like(xyz)
+    lab[..., 0] = 116. * xyz[..., 1] - 16.
+    lab[..., 1] = 500. * (xyz[..., 0] - xyz[..., 1])
+    lab[..., 2] = 200. * (xyz[..., 1] - xyz[..., 2])
+    return lab
+
+
+def rgb_to_hsv(images, dtype=np.float32):
+    """
+    Conversion RGB -> HSV d'1 image ou d'un lot, valeurs entre 0 et 1 comme skimage.color.rgb2hsv
+    """
+    rgb = _rgb_float(images, dtype)
+    red, green, blue = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    value = rgb.max(axis=-1)
+    delta = value - rgb.min(axis=-1)
+    hsv = np.empty_like(rgb)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Même priorité que skimage quand 2 canaux sont égaux au maximum : bleu, puis vert, puis rouge
+        hue = np.where(blue == value, 4. + (red - green) / delta,
+                       np.where(green == value, 2. + (blue - red) / delta, (green - blue) / delta))
+        hsv[..., 1] = np.where(delta == 0, 0, delta / value)
+    hsv[..., 0] = np.where(delta == 0, 0, (hue / 6.) % 1.)
+    hsv[..., 2] = value
+    return hsv
+
+
+def sobel_gradient(gray, horizontal_edges=True):
+    """
+    1 gradient de Sobel d'1 image (H, W) ou d'un lot (N, H, W), bords en mode 'reflect' comme skimage
+    Même noyau 3x3, même convolution et mêmes zéros positifs que skimage.filters.sobel_h / sobel_v : en float64 le
+    résultat est identique bit à bit, le signe des composantes nulles compris (il décide de ±180° pour arctan2)
+    :param horizontal_edges: True pour sobel_h (dérivée selon les lignes), False pour sobel_v (selon les colonnes)
+    :return: le gradient, même type que gray
+    """
+    edge, smooth = np.array(SOBEL_EDGE), np.array(SOBEL_SMOOTH)
+    kernel = np.outer(edge, smooth) if horizontal_edges else np.outer(smooth, edge)
+    gradient = ndi.convolve(gray, kernel.reshape((1,) * (gray.ndim - 2) + kernel.shape), mode='reflect')
+    gradient += 0  # -0 -> +0, comme la somme des axes de skimage
+    return gradient
+
+
+def sobel_gradients(gray):
+    """
+    Gradients de Sobel d'1 image (H, W) ou d'un lot (N, H, W), bords en mode 'reflect' comme skimage
+    :return: gradient_x (sobel_h, bords horizontaux) et gradient_y (sobel_v, bords verticaux), même type que gray
+    """
+    return sobel_gradient(gray, horizontal_edges=True), sobel_gradient(gray, horizontal_edges=False)
+
+
+def edge_magnitude(gradient_x, gradient_y):
+    """
+    Magnitude des gradients, normalisée entre 0 et 255 pour chaque image
+    """
+    magnitude = np.sqrt(gradient_x ** 2 + gradient_y ** 2)
+    magnitude /= magnitude.max(axis=(-2, -1), keepdims=True)
+    magnitude *= 255
+    return magnitude
+
+
+def separable_kernel(kernel, tol=1e-10):
+    """
+    Décompose un noyau 2D de rang 1 en un noyau colonne et un noyau ligne, kernel = outer(column, row)
+    :return: (column, row) ou None si le noyau n'est pas séparable
+    """
+    kernel = np.asarray(kernel, dtype=float)
+    if kernel.shape[0] == 1:
+        return np.ones(1), kernel[0]
+    if kernel.shape[1] == 1:
+        return kernel[:, 0], np.ones(1)
+    u, s, vt = np.linalg.svd(kernel)
+    if s[0] == 0 or s[1] > tol * s[0]:
+        return None
+    return u[:, 0] * np.sqrt(s[0]), vt[0] * np.sqrt(s[0])
+
+
+def convolve2d(images, kernel, method='auto'):
+    """
+    Convolution 2D d'1 image (H, W) ou d'un lot (N, H, W), sortie de la même forme et du même type que l'entrée
+    Même padding de zéros que l'ancienne boucle de ImageCollection.convolve2d : kernel.shape[0] // 2 zéros avant et
+    kernel.shape[1] // 2 zéros après sur chaque axe, sortie[y, x] = somme(flip(kernel) * padded[y:y+k0, x:x+k1])
+    :param method: 'separable', 'direct', 'fft' ou 'auto' (séparable si le noyau est de rang 1, FFT pour les gros noyaux)
+    """
+    images = np.asarray(images)
+    kernel = np.asarray(kernel, dtype=float)
+    k0, k1 = kernel.shape
+    height, width = images.shape[-2:]
+    padding = [(0, 0)] * (images.ndim - 2) + [(k0 // 2, k1 // 2)] * 2
+    padded = np.pad(images, padding, mode='constant', constant_values=0).astype(np.float32)
+    flipped = kernel[::-1, ::-1]
+
+    separable = separable_kernel(flipped) if method in ('auto', 'separable') else None
+    if method == 'separable' and separable is None:
+        raise ValueError('Le noyau n\'est pas séparable (rang > 1)')
+    if method == 'auto':
+        method = 'separable' if separable is not None else 'fft' if kernel.size > FFT_KERNEL_SIZE else 'direct'
+
+    if method == 'fft':
+        full = fftconvolve(padded.astype(float), kernel.reshape((1,) * (images.ndim - 2) + kernel.shape),
+                           mode='full', axes=(-2, -1))
+        output = full[..., k0 - 1:k0 - 1 + height, k1 - 1:k1 - 1 + width]
+    else:
+        # ndimage centre un noyau de taille k à l'index k // 2, d'où le décalage du recadrage
+        if method == 'separable':
+            column, row = separable
+            output = ndi.correlate1d(padded, column, axis=-2, mode='constant', output=np.float64)
+            output = ndi.correlate1d(output, row, axis=-1, mode='constant')
+        elif method == 'direct':
+            output = ndi.correlate(padded, flipped.reshape((1,) * (images.ndim - 2) + flipped.shape),
+                                   mode='constant', output=np.float64)
+        else:
+            raise ValueError(f'Méthode de convolution inconnue: {method}')
+        output = output[..., k0 // 2:k0 // 2 + height, k1 // 2:k1 // 2 + width]
+
+    return output.astype(images.dtype, copy=False)
+
+
+def texture_gray(images):
+    """
+    Convertit 1 image ou un lot d'images RGB uint8 en gris uint8 comme (skic.rgb2gray(image) * 255).astype('uint8')
+    """
+    gray = (np.asarray(images) * (1 / 255.)) @ np.asarray(TEXTURE_GRAY_WEIGHTS)  # même arrondi que img_as_float
+    return (gray * 255).astype(np.uint8)
+
+
+def quantize_gray(gray, levels=256):
+    """
+    Réduit des niveaux de gris uint8 (0 à 255) à levels niveaux (0 à levels - 1)
+    """
+    if levels == 256:
+        return gray
+    return ((gray.astype(np.uint16) * levels) >> 8).astype(np.uint8)
+
+
+def _glcm_offset(distance, angle):
+    """
+    Décalage (ligne, colonne) d'une paire de pixels, arrondi comme skimage.feature.graycomatrix
+    """
+    row, column = np.sin(angle) * distance, np.cos(angle) * distance
+    return int(np.sign(row) * np.floor(abs(row) + 0.5)), int(np.sign(column) * np.floor(abs(column) + 0.5))
+
+
+def batch_glcm(gray, distances=(1,), angles=(0.,), levels=256, symmetric=True, normed=True):
+    """
+    Calcule les GLCM d'1 image (H, W) ou d'un lot (N, H, W) d'entiers entre 0 et levels - 1
+    Toutes les paires de pixels d'un lot sont comptées avec 1 seul bincount par combinaison distance/angle
+    :return: array (N, n_distances, n_angles, levels, levels), float64 si normed sinon comptes entiers
+    """
+    gray = np.asarray(gray)
+    if gray.ndim == 2:
+        gray = gray[np.newaxis]
+    n_images, rows, columns = gray.shape
+    image_offsets = (np.arange(n_images) * levels * levels).reshape(-1, 1, 1)
+
+    glcm = np.empty((n_images, len(distances), len(angles), levels, levels),
+                    dtype=np.float64 if normed else np.int64)
+    for d, distance in enumerate(distances):
+        for a, angle in enumerate(angles):
+            offset_row, offset_column = _glcm_offset(distance, angle)
+            first = gray[:, max(0, -offset_row):rows - max(0, offset_row),
+                         max(0, -offset_column):columns - max(0, offset_column)]
+            second = gray[:, max(0, offset_row):rows - max(0, -offset_row),
+                          max(0, offset_column):columns - max(0, -offset_column)]
+            pairs = image_offsets + first.astype(np.intp) * levels + second
+            counts = np.bincount(pairs.ravel(), minlength=n_images * levels * levels)
+            counts = counts.reshape(n_images, levels, levels)
+            if symmetric:
+                counts = counts + counts.transpose(0, 2, 1)
+            if normed:
+                totals = counts.sum(axis=(1, 2), keepdims=True)
+                glcm[:, d, a] = counts / np.where(totals == 0, 1, totals)
+            else:
+                glcm[:, d, a] = counts
+    return glcm
+
+
+def glcm_properties(glcm, properties=GLCM_PROPERTIES, average_angles=False):
+    """
+    Calcule les propriétés de texture d'un lot de GLCM (..., levels, levels), mêmes définitions que graycoprops
+    :param average_angles: moyenne des propriétés sur l'axe des angles (avant-dernier axe hors GLCM),
+        donne des propriétés invariantes en rotation
+    :return: dictionnaire propriété -> array de la forme de glcm sans les 2 derniers axes (et sans l'axe des angles
+        si average_angles)
+    """
+    P = glcm.astype(np.float64)
+    sums = P.sum(axis=(-2, -1), keepdims=True)
+    P = P / np.where(sums == 0, 1, sums)
+    levels = P.shape[-1]
+    I, J = np.ogrid[0:levels, 0:levels]
+
+    results = {}
+    for prop in properties:
+        if prop == 'contrast':
+            results[prop] = np.sum(P * (I - J) ** 2, axis=(-2, -1))
+        elif prop == 'dissimilarity':
+            results[prop] = np.sum(P * np.abs(I - J), axis=(-2, -1))
+        elif prop == 'homogeneity':
+            results[prop] = np.sum(P / (1. + (I - J) ** 2), axis=(-2, -1))
+        elif prop in ('ASM', 'energy'):
+            asm = np.sum(P ** 2, axis=(-2, -1))
+            results[prop] = asm if prop == 'ASM' else np.sqrt(asm)
+        elif prop == 'correlation':
+            diff_i = I - np.sum(I * P, axis=(-2, -1))[..., np.newaxis, np.newaxis]
+            diff_j = J - np.sum(J * P, axis=(-2, -1))[..., np.newaxis, np.newaxis]
+            std_i = np.sqrt(np.sum(P * diff_i ** 2, axis=(-2, -1)))
+            std_j = np.sqrt(np.sum(P * diff_j ** 2, axis=(-2, -1)))
+            cov = np.sum(P * diff_i * diff_j, axis=(-2, -1))
+            flat = (std_i < 1e-15) | (std_j < 1e-15)
+            results[prop] = np.where(flat, 1., cov / np.where(flat, 1., std_i * std_j))
+        else:
+            raise ValueError(f'{prop} is an invalid property')
+        if average_angles:
+            results[prop] = results[prop].mean(axis=-1)
+    return results
@@ -0,0 +1,130 @@
+"""
+Mesure du temps par étape de l'extraction des caractéristiques de la problématique
+APP2 S8 GIA
+Chaque étape (décodage, gris, sobel, étiquetage, statistiques de contours, GLCM, statistiques de couleur, écriture)
+accumule son temps réel (wall), son temps CPU, son nombre d'appels et son nombre d'images dans PROFILER.
+Le temps CPU est celui du thread qui exécute l'étape (time.thread_time) : les étapes mesurées en même temps dans
+plusieurs threads, e.g. le décodage des lots suivants par ImageCollection.iter_batches, ne comptent chacune que le leur.
+Les threads ajoutent leurs mesures sous un verrou, les processus de travail renvoient les leurs au processus
+principal qui les additionne (merge).
+
+Classes :
+    Profiler: temps par étape, résumé en dictionnaire ou en JSON
+    ProgressReporter: affiche la progression d'une extraction (images, images/s, temps restant), optionnel
+
+Variable :
+    PROFILER: le Profiler utilisé par les modules helpers
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Profiler:
+    """
+    Temps réel, temps CPU, nombre d'appels et d'images de chaque étape, utilisable depuis plusieurs threads
+    """
+    FIELDS = ('wall', 'cpu', 'calls', 'images')
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, n_images=0):
+        """
+        Mesure le bloc with comme 1 appel de l'étape name qui traite n_images images
+        Le temps CPU est celui du thread courant seulement
+        """
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.thread_time() - cpu, 1, n_images)
+
+    def add(self, name, wall, cpu, calls, images):
+        with self._lock:
+            stage = self.stages.setdefault(name, dict.fromkeys(Profiler.FIELDS, 0))
+            for field, value in zip(Profiler.FIELDS, (float(wall), float(cpu), int(calls), int(images))):
+                stage[field] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stage) for name, stage in self.stages.items()}
+
+    def since(self, snapshot):
+        """
+        Mesures ajoutées depuis un snapshot, e.g. celles d'1 tâche dans un processus de travail
+        """
+        empty = dict.fromkeys(Profiler.FIELDS, 0)
+        return {name: {field: stage[field] - snapshot.get(name, empty)[field] for field in Profiler.FIELDS}
+                for name, stage in self.snapshot().items()
+                if stage['calls'] != snapshot.get(name, empty)['calls']}
+
+    def merge(self, stages):
+        """
+        Additionne les mesures d'un autre processus
+        """
+        for name, stage in stages.items():
+            self.add(name, *(stage[field] for field in Profiler.FIELDS))
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+
+    def summary(self, wall_time=None, stages=None):
+        """
+        Résumé par étape, avec images/s, et le temps réel total de l'exécution s'il est donné
+        Avec plusieurs processus ou threads, le temps d'une étape est leur somme, il peut dépasser wall_time
+        :param stages: mesures à résumer, e.g. since(snapshot) pour 1 seule extraction, toutes par défaut
+        """
+        summary = {}
+        for name, stage in (self.snapshot() if stages is None else stages).items():
+            summary[name] = {**stage, 'images_per_second': stage['images'] / stage['wall'] if stage['wall'] else None}
+        return {'wall_time': wall_time, 'pid': os.getpid(), 'stages': summary}
+
+    def write_summary(self, path, wall_time=None, stages=None):
+        with open(path, 'w') as file:
+            json.dump(self.summary(wall_time, stages), file, indent=1)
+
+    def report(self, wall_time=None, stages=None):
+        """
+        Affiche le résumé sous forme de tableau
+        """
+        print(f'{"stage":>20} {"wall (s)":>10} {"cpu (s)":>10} {"calls":>8} {"images":>8} {"images/s":>10}')
+        for name, stage in self.summary(wall_time, stages)['stages'].items():
+            rate = f'{stage["images_per_second"]:.1f}' if stage['images_per_second'] else '-'
+            print(f'{name:>20} {stage["wall"]:>10.3f} {stage["cpu"]:>10.3f} {stage["calls"]:>8} '
+                  f'{stage["images"]:>8} {rate:>10}')
+        if wall_time is not None:
+            print(f'{"total":>20} {wall_time:>10.3f}')
+
+
+PROFILER = Profiler()
+
+
+class ProgressReporter:
+    """
+    Affiche la progression au plus toutes les interval secondes, rien si enabled est False
+    """
+    def __init__(self, total, enabled=True, interval=5., label='images'):
+        self.total = total
+        self.enabled = enabled
+        self.interval = interval
+        self.label = label
+        self.done = 0
+        self.start = time.perf_counter()
+        self.last = self.start
+
+    def update(self, n):
+        self.done += n
+        now = time.perf_counter()
+        if not self.enabled or (now - self.last < self.interval and self.done < self.total):
+            return
+        self.last = now
+        rate = self.done / (now - self.start) if now > self.start else 0.
+        remaining = (self.total - self.done) / rate if rate else float('nan')
+        print(f'{self.done}/{self.total} {self.label}, {rate:.1f} {self.label}/s, {remaining:.0f} s remaining')
@@ -13,6 +13,18 @@ import helpers.classifiers as classifiers
 
 VERBOSE = False
 data_processing = False #Leave that to False. If not, please delete .txt file before.
+incremental_extraction = True #Only analyse the images added or changed since the last extraction, see ImageCollection.update_feature_extraction.
+load_images = not (data_processing and incremental_extraction) or VERBOSE #The incremental extraction decodes only the images it needs.
+n_workers = os.cpu_count() #Number of processes used for the feature extraction, 1 to run everything in the main process.
+use_image_cache = True #Read the decoded images from data/cache instead of decoding every jpg at each run.
+shared_images = data_processing and load_images and n_workers > 1 and not use_image_cache #Put the images in shared memory so the workers don't copy them.
+decode_scale = 1 #Decode the jpg at 1/2, 1/4 or 1/8 of their size for a fast approximate pass, see benchmark_decode.py.
+show_progress = False #Print the progress of the feature extraction and the time spent in each stage (also saved in timings.json).
+feature_cache_size = 2**30 #Maximum size in bytes of the per-image feature cache in data/cache/features, None to disable it.
+#Features to extract, see helpers.features.EXTRACTORS: 'edges', 'texture', 'color_rgb', 'color_lab', 'color_hsv'.
+#Parameters can be given with a tuple, e.g. ('texture', {'levels': 32, 'angles': (0, 0.785, 1.571, 2.356), 'average_angles': True})
+extractors = ['edges', 'texture']
+selected_columns = ['num_features', 'contrast', 'homogeneity'] #Columns used by the classifiers, None to keep all of them.
 analyse_data = True
 deocrelate_data = analyse_data
 test_set = analyse_data
@@ -24,7 +36,8 @@ bayesien = False#analyse_data
 
 #######################################
 def problematique_APP2():
-    img = ImageCollection(load_all = True)
+    img = ImageCollection(load_all = load_images, shared_memory=shared_images, use_cache=use_image_cache,
+                          feature_cache_size=feature_cache_size, scale=decode_scale, progress=show_progress)
     if VERBOSE:
         print(f'The shape of the input is: {img.images.shape}')
         print(f'The shape of the label is: {img.labels.shape}')
@@ -42,7 +55,10 @@ def problematique_APP2():
     images_test = img.images[:6]
     label_test = img.labels[:6]
                 
-    img.generateRepresentation(img.images, img.labels, data_processing, analyse_data, deocrelate_data, test_set)
+    img.generateRepresentation(img.images, img.labels, data_processing, analyse_data, deocrelate_data, test_set,
+                               n_workers=n_workers, extractors=extractors, selected_columns=selected_columns,
+                               incremental=incremental_extraction)
+    img.release_shared_images()
 
 
     if neural_network:
@@ -0,0 +1,10 @@
+"""
+Configuration des tests : les modules s'importent comme helpers.<module> depuis le dossier code, comme les scripts
+"""
+
+import os
+import sys
+
+CODE_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if CODE_FOLDER not in sys.path:
+    sys.path.insert(0, CODE_FOLDER)
@@ -0,0 +1,75 @@
+"""
+Tests de non-régression de l'extracteur 'edges' par rapport au pipeline d'origine de ImageCollection :
+conversion en gris manuelle, skimage.filters.sobel_h / sobel_v en float64, 1 masque par région et np.arctan2
+Les images sont de vraies images de la base, 1 sur 49 pour couvrir les 3 classes
+"""
+
+import glob
+import os
+
+import numpy as np
+import pytest
+from scipy.ndimage import label
+from skimage import filters
+from skimage import io as skiio
+
+import helpers.features as ft
+
+IMAGE_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data',
+                            'baseDeDonneesImages')
+THRESHOLD = 50
+
+
+@pytest.fixture(scope='module')
+def images():
+    paths = sorted(glob.glob(os.path.join(IMAGE_FOLDER, '*.jpg')))[::49]
+    if not paths:
+        pytest.skip(f'Aucune image dans {IMAGE_FOLDER}')
+    return np.array([skiio.imread(path) for path in paths])
+
+
+def baseline_edge_features(image, threshold=THRESHOLD):
+    """
+    Caractéristiques de contours d'1 image, calculées comme le faisait ImageCollection avant l'extracteur 'edges'
+    """
+    gray = 0.2989 * image[:, :, 0] + 0.5870 * image[:, :, 1] + 0.1140 * image[:, :, 2]
+    gradient_x = filters.sobel_h(gray)
+    gradient_y = filters.sobel_v(gray)
+    magnitude = np.sqrt(gradient_x**2 + gradient_y**2)
+    magnitude = (magnitude / magnitude.max()) * 255
+
+    labeled_array, num_features = label((magnitude > threshold).astype(int))
+    lengths = np.zeros(num_features)
+    orientations = np.zeros(num_features)
+    for i in range(1, num_features + 1):
+        contour_pixels = labeled_array == i
+        lengths[i - 1] = np.sum(contour_pixels)
+        orientations[i - 1] = np.rad2deg(np.mean(np.arctan2(gradient_y[contour_pixels], gradient_x[contour_pixels])))
+    return [num_features, np.mean(lengths), np.sum(lengths), np.std(lengths), np.mean(orientations),
+            np.std(orientations)]
+
+
+def test_edge_orientation_matches_baseline(images):
+    features, columns = ft.extract_features(images, ['edges'], batch_size=8)
+    expected = np.array([baseline_edge_features(image) for image in images])
+    orientation = [columns.index('mean_orientation'), columns.index('std_orientation')]
+    np.testing.assert_allclose(features[:, orientation], expected[:, orientation], rtol=0, atol=1e-9)
+
+
+def test_edge_features_identical_to_baseline(images):
+    features, columns = ft.extract_features(images, ['edges'], batch_size=8)
+    expected = np.array([baseline_edge_features(image) for image in images])
+    assert columns == ft.get_schema(['edges'])
+    np.testing.assert_array_equal(features, expected)
+
+
+def test_image_collection_edges_identical_to_baseline(images, monkeypatch):
+    ImageCollection = pytest.importorskip('helpers.ImageCollection').ImageCollection
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(IMAGE_FOLDER)))
+    collection = ImageCollection()
+    edge_images, gradients_x, gradients_y = collection.get_edge_detection(images, chunk_size=8)
+    for i, image in enumerate(images):
+        labeled_array, num_features = collection.count_contours(edge_images[i], THRESHOLD)
+        features = [num_features, *collection.contour_lengths(labeled_array, num_features),
+                    *collection.contour_orientations(gradients_x[i], gradients_y[i], labeled_array, num_features)]
+        np.testing.assert_array_equal(features, baseline_edge_features(image))